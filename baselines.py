@@ -0,0 +1,241 @@
+import datetime
+import json
+import math
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; there the program and the watcher are not run side by side
+    fcntl = None
+
+# A bin is flagged when its count is this many standard deviations from the baseline mean
+Z_THRESHOLD = 3.0
+
+# Same-weekday days needed before a baseline is trusted enough to flag anything
+MIN_DAYS = 4
+
+
+class HourOfWeekBaseline:
+    def __init__(self, z_threshold=Z_THRESHOLD, min_days=MIN_DAYS):
+        """
+        Running mean and variance of vehicle counts per (junction, hour of week, vehicle type).
+
+        Every processed day folds its hourly counts into the statistics with
+        Welford's online update, so the baseline never needs past files again.
+        Flagging a new day compares each of its bins against the stored mean
+        and variance, which costs the same however many days came before.
+
+        Args:
+            z_threshold (float): Standard deviations from the mean that count as an anomaly
+            min_days (int): Days of the same weekday required before flagging
+        """
+        self.z_threshold = z_threshold
+        self.min_days = min_days
+        self.stats = {}  # (junction, hour of week, vehicle type) -> [days, mean, sum of squared deviations]
+        self.series = set()  # Every (junction, vehicle type) pair seen so far
+        self.weekday_days = [0] * 7  # Days folded in per weekday
+        self.days = set()  # Survey dates already folded in, as "DDMMYYYY"
+
+    def _bins(self, type_counts, weekday):
+        # Every bin of the weekday, including bins with no vehicles this day
+        series = self.series | {(junction, vehicle_type) for junction, _, vehicle_type in type_counts}
+        for junction, vehicle_type in series:
+            for hour in range(24):
+                yield (junction, weekday * 24 + hour, vehicle_type), type_counts.get((junction, hour, vehicle_type), 0)
+
+    def flag(self, type_counts, weekday):
+        """
+        Compares one day's counts with the baseline without changing it.
+
+        Args:
+            type_counts (dict): Vehicles per (junction, hour, vehicle type), the
+                "Type Counts" outcome of process_csv_data
+            weekday (int): Day of the week, 0 for Monday
+
+        Returns:
+            list: One dictionary per anomalous bin, largest deviation first
+        """
+        if self.weekday_days[weekday] < self.min_days:
+            return []
+
+        anomalies = []
+        for key, count in self._bins(type_counts, weekday):
+            days, mean, squares = self.stats.get(key, (self.weekday_days[weekday], 0.0, 0.0))
+            # Counts are roughly Poisson, so the spread is never taken below sqrt(mean);
+            # this keeps a bin that was always 0 or always 5 from flagging on a single vehicle
+            deviation = max(math.sqrt(squares / (days - 1)) if days > 1 else 0.0, math.sqrt(max(mean, 1.0)))
+            z_score = (count - mean) / deviation
+            if abs(z_score) >= self.z_threshold:
+                junction, hour_of_week, vehicle_type = key
+                anomalies.append({
+                    "Junction": junction,
+                    "Hour": hour_of_week % 24,
+                    "Vehicle Type": vehicle_type,
+                    "Count": count,
+                    "Expected": round(mean, 1),
+                    "Z Score": round(z_score, 1),
+                })
+        anomalies.sort(key=lambda anomaly: abs(anomaly["Z Score"]), reverse=True)
+        return anomalies
+
+    def update(self, type_counts, weekday):
+        """
+        Folds one day's counts into the running statistics.
+
+        Args:
+            type_counts (dict): Vehicles per (junction, hour, vehicle type)
+            weekday (int): Day of the week, 0 for Monday
+        """
+        previous_days = self.weekday_days[weekday]
+        for key, count in self._bins(type_counts, weekday):
+            stats = self.stats.get(key)
+            if stats is None:
+                # A bin seen for the first time had 0 vehicles on every earlier day
+                stats = self.stats[key] = [previous_days, 0.0, 0.0]
+            stats[0] += 1
+            delta = count - stats[1]
+            stats[1] += delta / stats[0]
+            stats[2] += delta * (count - stats[1])
+        self.series.update((junction, vehicle_type) for junction, _, vehicle_type in type_counts)
+        self.weekday_days[weekday] += 1
+
+    def observe_day(self, outcomes, day, month, year):
+        """
+        Flags a processed day against the baseline, then adds it to the baseline.
+
+        A day that was already added, e.g. by the watcher, is flagged but not
+        added twice. Outcomes without "Type Counts", e.g. from a cache entry
+        written before the baselines existed, are skipped: folding them in
+        would record a day on which no vehicle passed.
+
+        Args:
+            outcomes (dict): Outcomes returned by process_csv_data
+            day (int): Day of the survey
+            month (int): Month of the survey
+            year (int): Year of the survey
+
+        Returns:
+            list: The anomalies found, as returned by flag()
+        """
+        type_counts = outcomes.get("Type Counts")
+        if type_counts is None:
+            return []
+        weekday = datetime.date(year, month, day).weekday()
+        anomalies = self.flag(type_counts, weekday)
+        date_key = f"{day:02d}{month:02d}{year}"
+        if date_key not in self.days:
+            self.update(type_counts, weekday)
+            self.days.add(date_key)
+        return anomalies
+
+    def save(self, file_path):
+        """
+        Writes the baseline to a JSON file, replacing it atomically.
+
+        Args:
+            file_path (str): Destination of the baseline
+        """
+        payload = {
+            "stats": [[junction, hour_of_week, vehicle_type, stats]
+                      for (junction, hour_of_week, vehicle_type), stats in self.stats.items()],
+            "weekday_days": self.weekday_days,
+            "days": sorted(self.days),
+        }
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".baselines-")
+        with os.fdopen(fd, "w") as file:
+            json.dump(payload, file)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path, **options):
+        """
+        Reads a baseline saved with save(), or starts an empty one.
+
+        Args:
+            file_path (str): Path of the saved baseline
+            options: Passed on to the constructor, e.g. z_threshold
+
+        Returns:
+            HourOfWeekBaseline: The restored baseline
+        """
+        baseline = cls(**options)
+        try:
+            with open(file_path, "r") as file:
+                payload = json.load(file)
+        except FileNotFoundError:
+            return baseline
+        for junction, hour_of_week, vehicle_type, stats in payload["stats"]:
+            baseline.stats[(junction, hour_of_week, vehicle_type)] = stats
+            baseline.series.add((junction, vehicle_type))
+        baseline.weekday_days = payload["weekday_days"]
+        baseline.days = set(payload["days"])
+        return baseline
+
+
+@contextmanager
+def _locked(file_path):
+    # Holds an exclusive lock on file_path + ".lock" for as long as the block runs
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
+    with open(file_path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def record_day(file_path, outcomes, day, month, year):
+    """
+    Flags a processed day against the baseline stored in file_path and saves the updated baseline.
+
+    The program and the watcher both record days, possibly at the same
+    time. Each call therefore holds an exclusive lock on a lock file next to
+    the baseline (flock, where the platform has it) from reading the
+    baseline to saving it, so neither drops the other's update.
+
+    Args:
+        file_path (str): Path of the saved baseline
+        outcomes (dict): Outcomes returned by process_csv_data
+        day (int): Day of the survey
+        month (int): Month of the survey
+        year (int): Year of the survey
+
+    Returns:
+        list: The anomalies found, as returned by HourOfWeekBaseline.flag
+    """
+    with _locked(file_path):
+        baseline = HourOfWeekBaseline.load(file_path)
+        anomalies = baseline.observe_day(outcomes, day, month, year)
+        baseline.save(file_path)
+    return anomalies
+
+
+def weekday_name(day, month, year):
+    """
+    Returns the name of the weekday a survey date falls on, e.g. "Monday".
+    """
+    return datetime.date(year, month, day).strftime("%A")
+
+
+def describe_anomaly(anomaly):
+    """
+    Formats one anomaly for printing.
+
+    Args:
+        anomaly (dict): An anomaly returned by HourOfWeekBaseline.flag
+
+    Returns:
+        str: A one-line description
+    """
+    direction = "more" if anomaly["Count"] > anomaly["Expected"] else "fewer"
+    return (f"{anomaly['Count']} {anomaly['Vehicle Type']} at {anomaly['Junction']} "
+            f"between {anomaly['Hour']:02d}:00 and {anomaly['Hour'] + 1}:00, {direction} than the usual "
+            f"{anomaly['Expected']} (z = {anomaly['Z Score']})")
@@ -0,0 +1,154 @@
+import argparse
+import datetime
+import os
+import random
+
+
+# Column order of the survey files, matching traffic_dataDDMMYYYY.csv
+HEADER = ("JunctionName,Date,timeOfDay,travel_Direction_in,travel_Direction_out,"
+          "Weather_Conditions,JunctionSpeedLimit,VehicleSpeed,VehicleType,electricHybrid\n")
+
+# Junction name, share of traffic and speed limit, taken from the recorded surveys
+JUNCTIONS = [
+    ("Elm Avenue/Rabbit Road", 0.48, 30),
+    ("Hanley Highway/Westway", 0.52, 20),
+]
+
+# Relative frequencies observed in the recorded surveys
+VEHICLE_TYPES = [
+    ("Car", 640), ("Bicycle", 418), ("Van", 391), ("Motorcycle", 269),
+    ("Truck", 258), ("Buss", 250), ("Scooter", 246),
+]
+DIRECTIONS_IN = [
+    ("SW", 773), ("S", 359), ("N", 350), ("NW", 268),
+    ("W", 244), ("E", 244), ("SE", 119), ("NE", 115),
+]
+DIRECTIONS_OUT = [
+    ("SW", 417), ("SE", 390), ("NW", 374), ("N", 349),
+    ("W", 314), ("S", 276), ("E", 258), ("NE", 94),
+]
+WEATHER = [
+    ("Clear", 1130), ("Overcast", 611), ("Light Rain", 389), ("Bright", 333), ("Heavy Rain", 9),
+]
+
+# Vehicles per hour of the day, with the morning and evening peaks of the recorded surveys
+HOURLY_WEIGHTS = [
+    48, 58, 65, 69, 53, 79, 83, 111, 188, 181, 118, 102,
+    116, 127, 97, 88, 81, 164, 219, 136, 106, 77, 47, 59,
+]
+
+# Share of each vehicle type recorded as electric or hybrid
+ELECTRIC_SHARE = 0.34
+
+
+def _cumulative(weighted):
+    # Split (value, weight) pairs into the arguments random.choices expects
+    values = [value for value, _ in weighted]
+    total = 0
+    cum_weights = []
+    for _, weight in weighted:
+        total += weight
+        cum_weights.append(total)
+    return values, cum_weights
+
+
+def generate_rows(row_count, day, month, year, seed=0, batch_size=10000):
+    """
+    Generates survey rows for one day in batches of CSV text.
+
+    The output is fully determined by the arguments, so repeated runs with the
+    same seed produce byte-identical files.
+
+    Args:
+        row_count (int): Number of data rows to generate
+        day (int): Survey day
+        month (int): Survey month
+        year (int): Survey year
+        seed (int): Seed for the random number generator
+        batch_size (int): Number of rows joined into each yielded string
+
+    Yields:
+        str: A block of CSV lines, each terminated by a newline
+    """
+    rng = random.Random(seed)
+    date = f"{day:02d}/{month:02d}/{year}"
+
+    vehicle_types, vehicle_cum = _cumulative(VEHICLE_TYPES)
+    directions_in, directions_in_cum = _cumulative(DIRECTIONS_IN)
+    directions_out, directions_out_cum = _cumulative(DIRECTIONS_OUT)
+    weather_values, weather_cum = _cumulative(WEATHER)
+    hours, hours_cum = _cumulative(list(enumerate(HOURLY_WEIGHTS)))
+    junction_cum = _cumulative([(junction, share) for junction, share, _ in JUNCTIONS])[1]
+
+    # Weather is a property of the hour, not of the individual vehicle
+    hourly_weather = rng.choices(weather_values, cum_weights=weather_cum, k=24)
+
+    remaining = row_count
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        remaining -= size
+
+        junction_indexes = rng.choices(range(len(JUNCTIONS)), cum_weights=junction_cum, k=size)
+        row_hours = rng.choices(hours, cum_weights=hours_cum, k=size)
+        row_types = rng.choices(vehicle_types, cum_weights=vehicle_cum, k=size)
+        row_in = rng.choices(directions_in, cum_weights=directions_in_cum, k=size)
+        row_out = rng.choices(directions_out, cum_weights=directions_out_cum, k=size)
+
+        lines = []
+        for i in range(size):
+            junction_name, _, speed_limit = JUNCTIONS[junction_indexes[i]]
+            hour = row_hours[i]
+            seconds = rng.randrange(3600)
+            speed = max(1, int(rng.gauss(speed_limit * 0.85, 6)))
+            electric = "True" if rng.random() < ELECTRIC_SHARE else "False"
+            lines.append(
+                f"{junction_name},{date},{hour:02d}:{seconds // 60:02d}:{seconds % 60:02d},"
+                f"{row_in[i]},{row_out[i]},{hourly_weather[hour]},{speed_limit},{speed},"
+                f"{row_types[i]},{electric}\n"
+            )
+        yield "".join(lines)
+
+
+def write_survey(directory, row_count, day, month, year, seed=0):
+    """
+    Writes a synthetic survey file named like the recorded ones.
+
+    Args:
+        directory (str): Folder to write the file into
+        row_count (int): Number of data rows to generate
+        day (int): Survey day
+        month (int): Survey month
+        year (int): Survey year
+        seed (int): Seed for the random number generator
+
+    Returns:
+        str: Path of the written file
+    """
+    os.makedirs(directory, exist_ok=True)
+    file_path = os.path.join(directory, f"traffic_data{day:02d}{month:02d}{year}.csv")
+    with open(file_path, "w", newline="") as file:
+        file.write(HEADER)
+        for block in generate_rows(row_count, day, month, year, seed=seed):
+            file.write(block)
+    return file_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic traffic survey files.")
+    parser.add_argument("--rows", type=float, default=1e4, help="rows per file, e.g. 1e6")
+    parser.add_argument("--date", default="15062024", help="first survey date as DDMMYYYY")
+    parser.add_argument("--days", type=int, default=1, help="number of consecutive daily files")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_data", help="output folder")
+    args = parser.parse_args()
+
+    start = datetime.datetime.strptime(args.date, "%d%m%Y").date()
+    for offset in range(args.days):
+        survey_date = start + datetime.timedelta(days=offset)
+        file_path = write_survey(args.out, int(args.rows), survey_date.day, survey_date.month,
+                                 survey_date.year, seed=args.seed + offset)
+        print(f"Wrote {file_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+import argparse
+import http.client
+import importlib.util
+import itertools
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+WEB_DIR = os.path.join(REPO_ROOT, "web")
+
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import write_survey
+
+# Date of every generated upload; each request still gets its own file name
+LOAD_DAY, LOAD_MONTH, LOAD_YEAR = 15, 6, 2024
+
+# Default upload mix: rows per file -> relative share of requests
+DEFAULT_MIX = "1e3:6,1e4:3,1e5:1"
+
+# Seconds to wait for the server to answer its first request
+STARTUP_TIMEOUT = 30
+
+_BOUNDARY = "traffic-load-test-boundary"
+
+
+def parse_mix(text):
+    """
+    Parses an upload mix such as "1e3:6,1e4:3,1e5:1".
+
+    Args:
+        text (str): Comma-separated rows:weight pairs; a missing weight counts as 1
+
+    Returns:
+        list: (rows, weight) pairs
+    """
+    mix = []
+    for part in text.split(","):
+        rows, _, weight = part.strip().partition(":")
+        mix.append((int(float(rows)), float(weight or 1)))
+    if not mix or any(rows <= 0 or weight <= 0 for rows, weight in mix):
+        raise argparse.ArgumentTypeError(f"Invalid upload mix: {text!r}")
+    return mix
+
+
+class UploadPayloads:
+    def __init__(self, data_dir, mix, unique=True, seed=0):
+        """
+        Survey files for the upload mix, turned into multipart request bodies.
+
+        The web app answers a repeated upload, keyed by content and file name,
+        from its outcome cache. By default every request therefore gets its
+        own file name, which makes every request a full parse.
+
+        Args:
+            data_dir (str): Folder the survey files are generated into
+            mix (list): (rows, weight) pairs from parse_mix
+            unique (bool): False reuses one file name per size, measuring the outcome cache path instead
+            seed (int): Seed for the generated files and the request order
+        """
+        self.mix = mix
+        self.unique = unique
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        self.files = {}  # Rows -> file contents
+        for rows, _ in mix:
+            file_path = write_survey(os.path.join(data_dir, str(rows)), rows,
+                                     LOAD_DAY, LOAD_MONTH, LOAD_YEAR, seed=seed)
+            with open(file_path, "rb") as file:
+                self.files[rows] = file.read()
+
+    def next(self):
+        """
+        Picks the next upload by weight.
+
+        Returns:
+            tuple: (rows, request body, Content-Type header value)
+        """
+        with self.lock:
+            rows = self.random.choices([rows for rows, _ in self.mix], [weight for _, weight in self.mix])[0]
+            number = next(self.counter)
+        # The date in the name is all the app reads from it; the suffix only defeats the outcome cache
+        suffix = f"_{number}" if self.unique else f"_{rows}"
+        file_name = f"traffic_data{LOAD_DAY:02d}{LOAD_MONTH:02d}{LOAD_YEAR}{suffix}.csv"
+        body = b"".join([
+            f"--{_BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{file_name}"\r\n'
+            "Content-Type: text/csv\r\n\r\n".encode(),
+            self.files[rows],
+            f"\r\n--{_BOUNDARY}--\r\n".encode(),
+        ])
+        return rows, body, f"multipart/form-data; boundary={_BOUNDARY}"
+
+
+def start_server(server, port, workers, env):
+    """
+    Starts the web app on localhost, under gunicorn when it is installed.
+
+    Args:
+        server (str): "gunicorn", "dev" for Flask's threaded development server, or "auto"
+        port (int): Port to listen on
+        workers (int): gunicorn worker processes; the dev server always runs one process
+        env (dict): Environment of the server process
+
+    Returns:
+        tuple: (subprocess.Popen, name of the server actually started)
+    """
+    if server == "auto":
+        server = "gunicorn" if importlib.util.find_spec("gunicorn") else "dev"
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", f"127.0.0.1:{port}",
+                   "--timeout", "300", "app:app"]
+    else:
+        command = [sys.executable, "-c",
+                   f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    process = subprocess.Popen(command, cwd=WEB_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The {server} server exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            connection.close()
+            return process, server
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"The {server} server did not answer within {STARTUP_TIMEOUT} seconds")
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def process_tree_rss(root_pid):
+    """
+    Reads the resident memory of a process and all its descendants from /proc.
+
+    Under gunicorn this covers the master, every worker and the pool
+    processes the workers start for parsing.
+
+    Args:
+        root_pid (int): Process id of the server
+
+    Returns:
+        dict: Process id -> resident set size in KiB; empty where /proc is unavailable
+    """
+    parents = {}
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return {}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "r") as file:
+                # The command name may hold spaces, so fields are counted from the closing parenthesis
+                parents[pid] = int(file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+
+    tree = {root_pid}
+    grew = True
+    while grew:
+        children = {pid for pid, parent in parents.items() if parent in tree} - tree
+        grew = bool(children)
+        tree |= children
+
+    rss = {}
+    for pid in tree:
+        try:
+            with open(f"/proc/{pid}/status", "r") as file:
+                for line in file:
+                    if line.startswith("VmRSS:"):
+                        rss[pid] = int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return rss
+
+
+class MemorySampler:
+    def __init__(self, root_pid, interval):
+        """
+        Samples the server's memory on a background thread.
+
+        Args:
+            root_pid (int): Process id of the server
+            interval (float): Seconds between samples
+        """
+        self.root_pid = root_pid
+        self.interval = interval
+        self.samples = []  # [seconds since start, concurrency level, total KiB, {pid: KiB}]
+        self.level = None
+        self.started = time.perf_counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self):
+        while True:
+            rss = process_tree_rss(self.root_pid)
+            if rss:
+                self.samples.append([round(time.perf_counter() - self.started, 3), self.level,
+                                     sum(rss.values()), {str(pid): kib for pid, kib in sorted(rss.items())}])
+            if self.stop_event.wait(self.interval):
+                return
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def peaks(self, level):
+        """
+        Returns (peak total KiB, peak KiB of any one process) while a concurrency level ran.
+        """
+        samples = [sample for sample in self.samples if sample[1] == level]
+        if not samples:
+            return None, None
+        return (max(total for _, _, total, _ in samples),
+                max(max(per_process.values()) for _, _, _, per_process in samples))
+
+
+def send_upload(port, payloads, timeout):
+    """
+    Posts one upload to /submit on a fresh connection.
+
+    Returns:
+        dict: Rows in the file, upload size, HTTP status (0 on a connection error) and latency
+    """
+    rows, body, content_type = payloads.next()
+    started = time.perf_counter()
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        connection.request("POST", "/submit", body=body, headers={"Content-Type": content_type})
+        response = connection.getresponse()
+        response.read()
+        status = response.status
+        connection.close()
+    except OSError:
+        status = 0
+    return {"rows": rows, "bytes": len(body), "status": status, "seconds": time.perf_counter() - started}
+
+
+def percentiles(latencies):
+    """
+    Returns the p50, p95 and p99 of a list of latencies in seconds.
+    """
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None}
+    if len(latencies) == 1:
+        return {"p50": latencies[0], "p95": latencies[0], "p99": latencies[0]}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50": round(cuts[49], 4), "p95": round(cuts[94], 4), "p99": round(cuts[98], 4)}
+
+
+def run_level(port, payloads, concurrency, duration, max_requests, timeout):
+    """
+    Keeps concurrency uploads in flight until the duration or request count runs out.
+
+    Each client sends its next upload as soon as the previous one returns
+    (a closed loop), so throughput is what the server sustains at that
+    concurrency rather than a fixed arrival rate.
+
+    Returns:
+        tuple: (list of request results, elapsed seconds)
+    """
+    results = []
+    lock = threading.Lock()
+    issued = itertools.count()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            if max_requests and next(issued) >= max_requests:
+                return
+            result = send_upload(port, payloads, timeout)
+            with lock:
+                results.append(result)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        for _ in range(concurrency):
+            clients.submit(client)
+    return results, time.perf_counter() - started
+
+
+def summarize(concurrency, results, elapsed, sampler):
+    """
+    Reduces the requests of one concurrency level to latency, throughput and memory figures.
+    """
+    ok = [result for result in results if result["status"] == 200]
+    summary = {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(ok) / elapsed, 2) if elapsed > 0 else 0,
+        "rows_per_sec": round(sum(result["rows"] for result in ok) / elapsed) if elapsed > 0 else 0,
+        "mb_per_sec": round(sum(result["bytes"] for result in ok) / elapsed / 1e6, 2) if elapsed > 0 else 0,
+    }
+    summary.update(percentiles([result["seconds"] for result in ok]))
+    summary["by_rows"] = {
+        str(rows): dict(requests=len(latencies), **percentiles(latencies))
+        for rows, latencies in sorted(_latencies_by_rows(ok).items())
+    }
+    summary["peak_rss_kib"], summary["peak_process_rss_kib"] = sampler.peaks(concurrency)
+    return summary
+
+
+def _latencies_by_rows(results):
+    by_rows = {}
+    for result in results:
+        by_rows.setdefault(result["rows"], []).append(result["seconds"])
+    return by_rows
+
+
+def compare_to_baseline(levels, baseline_path, tolerance):
+    """
+    Compares p95 latency and throughput per concurrency level against a previous report.
+
+    Args:
+        levels (list): Level summaries from this run
+        baseline_path (str): Path of an earlier JSON report
+        tolerance (float): Allowed fractional slowdown, e.g. 0.2 for 20%
+
+    Returns:
+        list: Descriptions of every level that regressed
+    """
+    with open(baseline_path, "r") as file:
+        baseline = {level["concurrency"]: level for level in json.load(file)["levels"]}
+
+    regressions = []
+    for level in levels:
+        previous = baseline.get(level["concurrency"])
+        if not previous:
+            continue
+        if level["p95"] and previous["p95"] and level["p95"] > previous["p95"] * (1 + tolerance):
+            regressions.append(f"concurrency {level['concurrency']}: p95 {level['p95']}s, "
+                               f"baseline {previous['p95']}s")
+        if level["requests_per_sec"] < previous["requests_per_sec"] * (1 - tolerance):
+            regressions.append(f"concurrency {level['concurrency']}: {level['requests_per_sec']} requests/sec, "
+                               f"baseline {previous['requests_per_sec']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the web /submit route with concurrent synthetic uploads.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="uploads kept in flight, one run per level (default: 1 4 16)")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level (default: 20)")
+    parser.add_argument("--requests", type=int, default=0,
+                        help="stop a level after this many uploads, if sooner than --duration")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"rows per upload and relative share, e.g. {DEFAULT_MIX} (the default)")
+    parser.add_argument("--repeat-uploads", action="store_true",
+                        help="reuse one file name per size, so repeats are answered from the outcome cache")
+    parser.add_argument("--server", choices=["auto", "gunicorn", "dev"], default="auto",
+                        help="gunicorn when installed, else Flask's development server (default: auto)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes (default: 2)")
+    parser.add_argument("--port", type=int, help="port for the server (default: a free port)")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds before an upload counts as failed")
+    parser.add_argument("--sample-interval", type=float, default=0.5,
+                        help="seconds between memory samples (default: 0.5)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="folder for generated files (default: a temporary folder)")
+    parser.add_argument("--output", help="write the JSON report, including the memory timeline, to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline (default 0.2)")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="traffic_load_")
+    payloads = UploadPayloads(data_dir, args.mix, unique=not args.repeat_uploads, seed=args.seed)
+    port = args.port or _free_port()
+
+    # Uploads and metrics go to folders of their own, not those of a server already running here
+    upload_dir = os.path.join(data_dir, "uploads")
+    env = dict(os.environ, TRAFFIC_UPLOAD_DIR=upload_dir, TRAFFIC_METRICS_DIR=os.path.join(data_dir, "metrics"),
+               PYTHONPATH=REPO_ROOT)
+    process, server = start_server(args.server, port, args.workers, env)
+    print(f"Started the {server} server on port {port}"
+          + (f" with {args.workers} workers" if server == "gunicorn" else ""))
+    sampler = MemorySampler(process.pid, args.sample_interval)
+    sampler.start()
+
+    levels = []
+    try:
+        # One upload of each size first, so start-up work (worker pools, imports) is not measured
+        for _ in args.mix:
+            send_upload(port, payloads, args.timeout)
+        for concurrency in args.concurrency:
+            sampler.level = concurrency
+            results, elapsed = run_level(port, payloads, concurrency, args.duration, args.requests, args.timeout)
+            sampler.level = None
+            level = summarize(concurrency, results, elapsed, sampler)
+            levels.append(level)
+            peak = f"{level['peak_rss_kib']:>10,} KiB peak RSS" if level["peak_rss_kib"] else "memory n/a"
+            print(f"{concurrency:>4} in flight  {level['requests']:>6} uploads  {level['errors']:>4} errors  "
+                  f"{level['requests_per_sec']:>8.2f} req/s  p50 {level['p50'] or 0:.3f}s  "
+                  f"p95 {level['p95'] or 0:.3f}s  p99 {level['p99'] or 0:.3f}s  {peak}")
+    finally:
+        sampler.stop()
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        # The app deletes each upload once it is processed; anything left over is a leak worth reporting
+        leftover = os.listdir(upload_dir) if os.path.isdir(upload_dir) else []
+        if leftover:
+            print(f"Warning: {len(leftover)} files were left in {upload_dir}")
+
+    if args.output:
+        report = {
+            "server": server,
+            "workers": args.workers if server == "gunicorn" else 1,
+            "mix": [[rows, weight] for rows, weight in args.mix],
+            "unique_uploads": not args.repeat_uploads,
+            "levels": levels,
+            "memory": sampler.samples,
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        regressions = compare_to_baseline(levels, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+WEB_DIR = os.path.join(REPO_ROOT, "web")
+
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_data import write_survey
+
+# Date used for every generated benchmark file
+BENCH_DAY, BENCH_MONTH, BENCH_YEAR = 15, 6, 2024
+
+
+def bench_parse(file_path):
+    """
+    Reads and validates the survey the way process_csv_data does, one batch in memory at a time.
+    """
+    from survey_io import open_survey
+    from validation import RowValidator
+    with open_survey(file_path) as file:
+        return sum(1 for _ in RowValidator().clean_rows(csv.DictReader(file)))
+
+
+def bench_metrics(file_path):
+    """
+    Runs the full outcome computation from main.py.
+    """
+    from main import process_csv_data
+    outcomes = process_csv_data(file_path, BENCH_DAY, BENCH_MONTH, BENCH_YEAR)
+    return outcomes["Total Vehicles"]
+
+
+def bench_histogram(file_path):
+    """
+    Bins the survey into the 24 hourly histogram buckets as its rows are read.
+    """
+    from gui import bin_hourly_counts
+    # Rows are binned as they stream in, so the timing covers reading them as well as binning
+    start = time.perf_counter()
+    with open(file_path, mode='r') as file:
+        hourly_data = bin_hourly_counts(csv.DictReader(file))
+    return sum(sum(counts) for counts in hourly_data.values()), time.perf_counter() - start
+
+
+def bench_web(file_path):
+    """
+    Uploads the survey to the Flask /submit route through the test client.
+    """
+    sys.path.insert(0, WEB_DIR)
+    from app import app
+    client = app.test_client()
+    # The Flask import is excluded so only the request itself is timed
+    start = time.perf_counter()
+    with open(file_path, "rb") as file:
+        response = client.post(
+            "/submit",
+            data={"file": (file, os.path.basename(file_path))},
+            content_type="multipart/form-data",
+        )
+    if response.status_code != 200:
+        raise RuntimeError(f"/submit returned {response.status_code}")
+    return None, time.perf_counter() - start
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "metrics": bench_metrics,
+    "histogram": bench_histogram,
+    "web": bench_web,
+}
+
+
+def run_single(name, file_path, rows):
+    """
+    Runs one benchmark in the current process and returns its measurements.
+
+    Args:
+        name (str): Benchmark name, a key of BENCHMARKS
+        file_path (str): Survey file to benchmark against
+        rows (int): Number of data rows in the file
+
+    Returns:
+        dict: Elapsed seconds, rows/sec and peak resident set size in KiB
+    """
+    start = time.perf_counter()
+    result = BENCHMARKS[name](file_path)
+    elapsed = time.perf_counter() - start
+    # Benchmarks that time only part of their work return (value, elapsed)
+    if isinstance(result, tuple):
+        elapsed = result[1]
+
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss //= 1024
+
+    return {
+        "benchmark": name,
+        "rows": rows,
+        "seconds": round(elapsed, 6),
+        "rows_per_sec": round(rows / elapsed) if elapsed > 0 else 0,
+        "peak_rss_kib": peak_rss,
+    }
+
+
+def run_isolated(name, file_path, rows):
+    # A fresh interpreter per benchmark keeps the peak RSS of one from leaking into the next
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--single", name, "--file", file_path,
+         "--rows", str(rows)],
+        capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        # A process killed by a signal, e.g. by the OOM killer, may leave nothing on stderr
+        lines = completed.stderr.strip().splitlines()
+        if lines:
+            error = lines[-1]
+        elif completed.returncode < 0:
+            error = f"killed by signal {-completed.returncode}"
+        else:
+            error = f"exited with code {completed.returncode}"
+        return {"benchmark": name, "rows": rows, "error": error}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare_to_baseline(results, baseline_path, tolerance):
+    """
+    Compares rows/sec against a previous report.
+
+    Args:
+        results (list): Measurements from this run
+        baseline_path (str): Path of an earlier JSON report
+        tolerance (float): Allowed fractional slowdown, e.g. 0.2 for 20%
+
+    Returns:
+        list: Descriptions of every benchmark that regressed
+    """
+    with open(baseline_path, "r") as file:
+        baseline = {(entry["benchmark"], entry["rows"]): entry for entry in json.load(file)}
+
+    regressions = []
+    for entry in results:
+        previous = baseline.get((entry["benchmark"], entry["rows"]))
+        if not previous or "rows_per_sec" not in previous or "rows_per_sec" not in entry:
+            continue
+        if entry["rows_per_sec"] < previous["rows_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{entry['benchmark']} @ {entry['rows']} rows: "
+                f"{entry['rows_per_sec']} rows/sec, baseline {previous['rows_per_sec']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing, metrics, histogram binning and the web route.")
+    parser.add_argument("--rows", type=float, nargs="+", default=[1e4, 1e5],
+                        help="dataset sizes to benchmark, e.g. 1e4 1e6")
+    parser.add_argument("--bench", nargs="+", choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="folder for generated files (default: a temporary folder)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline (default 0.2)")
+    parser.add_argument("--single", choices=sorted(BENCHMARKS), help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.single, args.file, int(args.rows[0]))))
+        return
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="traffic_bench_")
+    results = []
+    for rows in (int(size) for size in args.rows):
+        # Each size gets its own folder since file names only encode the date
+        file_path = write_survey(os.path.join(data_dir, str(rows)), rows,
+                                 BENCH_DAY, BENCH_MONTH, BENCH_YEAR, seed=args.seed)
+        for name in args.bench:
+            entry = run_isolated(name, file_path, rows)
+            results.append(entry)
+            if "error" in entry:
+                print(f"{name:>10} {rows:>12,} rows  failed: {entry['error']}")
+            else:
+                print(f"{name:>10} {rows:>12,} rows  {entry['seconds']:>9.3f}s  "
+                      f"{entry['rows_per_sec']:>12,} rows/sec  {entry['peak_rss_kib']:>10,} KiB peak RSS")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+from operator import itemgetter
+
+# Columns that identify one vehicle passing; rows equal on all of them are re-sent copies
+FINGERPRINT_COLUMNS = (
+    "JunctionName",
+    "Date",
+    "timeOfDay",
+    "travel_Direction_in",
+    "travel_Direction_out",
+    "VehicleSpeed",
+    "VehicleType",
+)
+
+# Fingerprints held in memory before older ones are spilled to disk
+MEMORY_LIMIT = 1_000_000
+
+# Bits per spilled fingerprint in the Bloom filter that guards the disk lookups (~1.5% false positives)
+BLOOM_BITS_PER_ITEM = 16
+
+
+class BloomFilter:
+    def __init__(self, capacity, bits_per_item=BLOOM_BITS_PER_ITEM):
+        """
+        Fixed-size set membership test that may answer "maybe" but never misses.
+
+        Two bit positions are taken from the low and high halves of the 64-bit
+        fingerprint. Two probes with a roomier bit array match the false
+        positive rate of the textbook seven probes at a fraction of the
+        per-row cost in Python.
+
+        Args:
+            capacity (int): Items the filter is sized for; more still work, with more false positives
+            bits_per_item (int): Bits of the bit array per expected item
+        """
+        self.size = max(64, capacity * bits_per_item)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, fingerprint):
+        first = fingerprint % self.size
+        second = (fingerprint >> 32) % self.size
+        self.bits[first >> 3] |= 1 << (first & 7)
+        self.bits[second >> 3] |= 1 << (second & 7)
+
+    def __contains__(self, fingerprint):
+        first = fingerprint % self.size
+        if not self.bits[first >> 3] & (1 << (first & 7)):
+            return False
+        second = (fingerprint >> 32) % self.size
+        return bool(self.bits[second >> 3] & (1 << (second & 7)))
+
+
+class RowDeduplicator:
+    def __init__(self, memory_limit=MEMORY_LIMIT, spill_dir=None):
+        """
+        Drops rows that were already seen, with a bounded memory footprint.
+
+        Each row is reduced to a 64-bit fingerprint of FINGERPRINT_COLUMNS and
+        kept in an in-memory set. When the set reaches memory_limit entries it
+        is moved into a temporary SQLite table and cleared; a Bloom filter over
+        everything spilled lets almost every new row skip the disk lookup, so
+        files far larger than memory_limit keep their ingest speed.
+
+        Args:
+            memory_limit (int): Fingerprints kept in memory before spilling
+            spill_dir (str): Folder for the spill database; the system temp folder by default
+        """
+        self.memory_limit = memory_limit
+        self.spill_dir = spill_dir
+        self.seen = set()
+        self.bloom = None
+        self.database = None
+        self.spill_path = None
+        self.rows_checked = 0
+        self.duplicates = 0
+
+    def _spilled(self, fingerprint):
+        # Only asked after the Bloom filter says "maybe", so most new rows never reach the disk
+        return self.database.execute("SELECT 1 FROM seen WHERE fingerprint = ?", (fingerprint,)).fetchone() is not None
+
+    def unique_rows(self, rows):
+        """
+        Passes rows through, leaving out any whose fingerprint was already seen.
+
+        Args:
+            rows: Iterable of row dictionaries, e.g. from RowValidator.clean_rows
+
+        Yields:
+            dict: Rows seen for the first time
+        """
+        key = itemgetter(*FINGERPRINT_COLUMNS)
+        seen = self.seen
+        bloom = self.bloom
+        for row in rows:
+            self.rows_checked += 1
+            # hash() of the tuple is a 64-bit fingerprint; it is stable within one process,
+            # which is all the in-memory set and the per-run spill table need
+            fingerprint = hash(key(row))
+            if fingerprint in seen or (bloom is not None and fingerprint in bloom and self._spilled(fingerprint)):
+                self.duplicates += 1
+                continue
+            seen.add(fingerprint)
+            if len(seen) >= self.memory_limit:
+                self._spill()
+                seen = self.seen
+                bloom = self.bloom
+            yield row
+
+    def _spill(self):
+        if self.database is None:
+            import sqlite3  # Only files with more than memory_limit distinct rows get this far
+
+            fd, self.spill_path = tempfile.mkstemp(dir=self.spill_dir, prefix="dedup-", suffix=".sqlite")
+            os.close(fd)
+            self.database = sqlite3.connect(self.spill_path)
+            # The spill table only lives for this run, so durability is traded for speed
+            self.database.execute("PRAGMA journal_mode = OFF")
+            self.database.execute("PRAGMA synchronous = OFF")
+            self.database.execute("CREATE TABLE seen (fingerprint INTEGER PRIMARY KEY) WITHOUT ROWID")
+            # Sized for several spills; beyond that it still works with more false positives
+            self.bloom = BloomFilter(self.memory_limit * 8)
+        # Sorted inserts walk the B-tree in order instead of jumping around it
+        self.database.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((value,) for value in sorted(self.seen)))
+        self.database.commit()
+        for fingerprint in self.seen:
+            self.bloom.add(fingerprint)
+        self.seen = set()
+
+    def close(self):
+        """
+        Removes the spill database, if one was created.
+        """
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+            os.remove(self.spill_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
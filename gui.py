@@ -1,111 +1,227 @@
 import tkinter as tk
+from tkinter import ttk
 import csv
+import datetime
+
+from instrumentation import timings
+from rollups import RESOLUTIONS, SECONDS_PER_DAY, TimeRollups, describe_resolution, resolution_seconds
+from survey_io import open_survey
+from timeparse import hour_of
+from validation import RowValidator
+
+
+def bin_hourly_counts(traffic_data):
+    """
+    Counts vehicles per hour for each junction.
+
+    Args:
+        traffic_data: Rows of traffic data as dictionaries, e.g. a list or a csv.DictReader
+
+    Returns:
+        dict: Maps each hour (0-23) to [Elm Avenue count, Hanley Highway count]
+    """
+    # Initialize a dictionary to store vehicle counts per hour for each junction
+    hourly_data = {hour: [0, 0] for hour in range(24)}
+
+    # Populate hourly_data with vehicle counts from traffic_data
+    for record in traffic_data:
+        hour = hour_of(record['timeOfDay'])  # Extract hour from timeOfDay
+        if record['JunctionName'] == 'Elm Avenue/Rabbit Road':
+            hourly_data[hour][0] += 1  # Increment Elm Avenue count
+        elif record['JunctionName'] == 'Hanley Highway/Westway':
+            hourly_data[hour][1] += 1  # Increment Hanley Highway count
+
+    return hourly_data
 
 
 # Task D: Histogram Display using tkinter
-class HistogramApp:
-    def __init__(self, traffic_data, date):
+class HistogramViewer:
+    def __init__(self, resolution="hour"):
         """
-        Initializes the histogram application with the traffic data and selected date.
+        One histogram window reused for every dataset of the session.
+
+        The window keeps a single Tk root and a fixed set of canvas items per
+        resolution (two bars per time bucket, plus two count labels where the
+        buckets are wide enough to read them). Picking another date or
+        resolution from the drop-downs, or pressing the Left/Right arrow keys,
+        moves and relabels those items in place. Each dataset is rolled up
+        once when it is added, so switching between hundreds of days or
+        between resolutions does no further work.
 
         Args:
-            traffic_data (list): A list of dictionaries containing traffic data
-            date (str): The selected date in the format DDMMYYYY
+            resolution: Resolution shown first, any name accepted by rollups.resolution_seconds
         """
-        self.traffic_data = traffic_data
-        self.date = date
+        self.datasets = {}  # Date label -> TimeRollups of the dataset
+        self.width = resolution_seconds(resolution)  # Bucket width shown, in seconds
         self.root = tk.Tk()
-        self.root.title(f"Histogram - {self.date}")
+        self.root.title("Histogram")
+        # Closing the window only hides it, so the same root can be shown again for the next dataset
+        self.root.protocol("WM_DELETE_WINDOW", self.root.quit)
+
+        picker = tk.Frame(self.root)
+        picker.pack(fill="x", padx=10, pady=(10, 0))
+        tk.Label(picker, text="Survey date:", font=("Arial", 10)).pack(side="left")
+        self.selected = tk.StringVar()
+        self.date_picker = ttk.Combobox(picker, textvariable=self.selected, state="readonly", width=14)
+        self.date_picker.pack(side="left", padx=5)
+        self.date_picker.bind("<<ComboboxSelected>>", lambda event: self.show(self.selected.get()))
+        self.root.bind("<Left>", lambda event: self.step(-1))
+        self.root.bind("<Right>", lambda event: self.step(1))
+
+        # Resolution labels shown in the drop-down -> bucket width in seconds
+        self.resolutions = {describe_resolution(width): width for width in RESOLUTIONS.values()}
+        tk.Label(picker, text="Resolution:", font=("Arial", 10)).pack(side="left", padx=(15, 0))
+        self.selected_resolution = tk.StringVar(value=describe_resolution(self.width))
+        resolution_picker = ttk.Combobox(picker, textvariable=self.selected_resolution, state="readonly",
+                                         width=12, values=list(self.resolutions))
+        resolution_picker.pack(side="left", padx=5)
+        resolution_picker.bind("<<ComboboxSelected>>", lambda event: self.show(
+            self.selected.get(), self.resolutions[self.selected_resolution.get()]))
+
         self.canvas = tk.Canvas(self.root, width=900, height=620, bg="white")
         self.canvas.pack()
+        self._create_items()
 
-    def setup_window(self):
-        """
-        Sets up the Tkinter window and canvas for the histogram.
+    def _create_items(self):
+        # Title, axis label and legend never move; bars and counts are placed by show()
+        self.title_item = self.canvas.create_text(400, 40, text="", font=("Poppins", 16))
+        self.canvas.create_text(400, 580, text="Hours 00:00 to 24:00", font=("Poppins", 12))
 
-        This includes creating the title, X-axis label, and setting up the
-        canvas for the histogram drawing.
-        """
+        self.bar_items = {}  # Bucket width -> per bucket: (Elm bar, Elm count, Hanley bar, Hanley count)
+        self._bars(self.width)
+        for hour in range(24):
+            self.canvas.create_text(60 + hour * 30 + 14, 560, text=f"{hour:02d}", font=("Arial", 8))
 
-        # Title
-        self.canvas.create_text(
-            400, 40,
-            text=f"Histogram of Vehicle Frequency per Hour ({self.date})",
-            font=("Poppins", 16)
-        )
+        self.canvas.create_rectangle(650, 100, 670, 120, fill="#4bc949", outline="#4bc949")
+        self.canvas.create_text(700, 110, text="Elm Avenue/Rabbit Road", anchor="w", font=("Arial", 10))
+        self.canvas.create_rectangle(650, 130, 670, 150, fill="#f9969b", outline="#f9969b")
+        self.canvas.create_text(700, 140, text="Hanley Highway/Westway", anchor="w", font=("Arial", 10))
 
-        # X-axis Label
-        self.canvas.create_text(
-            400, 580,
-            text="Hours 00:00 to 24:00",
-            font=("Poppins", 12)
-        )
+    def _bars(self, width):
+        # Canvas items of one resolution, created the first time it is shown and tagged
+        # so the whole set can be hidden while another resolution is on screen
+        if width in self.bar_items:
+            return self.bar_items[width]
+        tag = f"bars{width}"
+        bucket = 720 * width / SECONDS_PER_DAY  # 30 pixels per hour, as the hourly histogram always had
+        items = []
+        for index in range(SECONDS_PER_DAY // width):
+            x0 = 60 + index * bucket
+            # Counts are only written above bars wide enough to read them
+            labelled = bucket >= 30
+            items.append((
+                self.canvas.create_rectangle(x0, 550, x0 + bucket / 3, 550, fill="#4bc949", outline="#4bc949", tags=tag),
+                self.canvas.create_text(x0 + bucket / 6, 540, text="", font=("Arial", 8), fill="green", tags=tag)
+                if labelled else None,
+                self.canvas.create_rectangle(x0 + bucket / 2, 550, x0 + bucket * 5 / 6, 550, fill="#f9969b",
+                                             outline="#f9969b", tags=tag),
+                self.canvas.create_text(x0 + bucket * 2 / 3, 540, text="", font=("Arial", 8), fill="red", tags=tag)
+                if labelled else None,
+            ))
+        self.bar_items[width] = items
+        return items
+
+    def add_dataset(self, date, traffic_data=None, hourly_data=None, rollups=None):
+        """
+        Adds a dataset to the date picker and shows it.
 
-    def draw_histogram(self):
+        Args:
+            date (str): Label of the dataset, normally the survey date as DD/MM/YYYY
+            traffic_data (list): Rows of the survey file, rolled up here if nothing else is given
+            hourly_data (dict): Counts already binned by bin_hourly_counts; only hourly and daily
+                histograms can be drawn from these
+            rollups (TimeRollups): The "Time Rollups" outcome of process_csv_data, e.g. from the survey cache
         """
-        Draws the histogram with axes, labels, and bars for vehicle frequency per hour.
+        if rollups is None:
+            if hourly_data is not None:
+                rollups = TimeRollups.from_hourly_counts(hourly_data)
+            else:
+                rollups = TimeRollups.from_rows(traffic_data)
+        self.datasets[date] = rollups
+        self.date_picker["values"] = sorted(self.datasets, key=_date_sort_key)
+        self.show(date)
+
+    def show(self, date, resolution=None):
         """
-        # Initialize a dictionary to store vehicle counts per hour for each junction
-        hourly_data = {hour: [0, 0] for hour in range(24)}
+        Redraws the histogram for one of the added datasets by updating the existing canvas items.
 
-        # Populate hourly_data with vehicle counts from traffic_data
-        for record in self.traffic_data:
-            hour = int(record['timeOfDay'].split(":")[0])  # Extract hour from timeOfDay
-            if record['JunctionName'] == 'Elm Avenue/Rabbit Road':
-                hourly_data[hour][0] += 1  # Increment Elm Avenue count
-            elif record['JunctionName'] == 'Hanley Highway/Westway':
-                hourly_data[hour][1] += 1  # Increment Hanley Highway count
+        Args:
+            date (str): Label the dataset was added under
+            resolution: Resolution to switch to; the current one when not given
+        """
+        rollups = self.datasets[date]
+        width = self.width if resolution is None else resolution_seconds(resolution)
+        try:
+            counts = rollups.junction_pairs(width)
+        except ValueError:
+            # Datasets cached before per-minute counts were kept only go down to whole hours
+            width = RESOLUTIONS["hour"]
+            counts = rollups.junction_pairs(width)
+        if width != self.width:
+            self.canvas.itemconfigure(f"bars{self.width}", state="hidden")
+            self.width = width
+        self.canvas.itemconfigure(f"bars{width}", state="normal")
+
+        self.selected.set(date)
+        self.selected_resolution.set(describe_resolution(width))
+        self.root.title(f"Histogram - {date}")
+        self.canvas.itemconfigure(
+            self.title_item, text=f"Histogram of Vehicle Frequency per {describe_resolution(width)} ({date})")
 
         # Calculate the maximum traffic count to determine scaling factor
-        max_traffic = max(max(counts) for counts in hourly_data.values())
+        max_traffic = max(max(pair) for pair in counts)
         scaling_factor = 450 / max_traffic if max_traffic > 0 else 1
 
-        # Draw histogram bars and labels for each hour
-        for hour, (elm_count, hanley_count) in hourly_data.items():
-            x0 = 60 + hour * 30  # Calculate x-coordinate based on hour
+        for (elm_count, hanley_count), (elm_bar, elm_label, hanley_bar, hanley_label) in zip(counts, self._bars(width)):
+            x0, _, x1, _ = self.canvas.coords(elm_bar)
             elm_height = elm_count * scaling_factor
+            self.canvas.coords(elm_bar, x0, 550 - elm_height, x1, 550)
+            x2, _, x3, _ = self.canvas.coords(hanley_bar)
             hanley_height = hanley_count * scaling_factor
+            self.canvas.coords(hanley_bar, x2, 550 - hanley_height, x3, 550)
 
-            # Draw Elm Avenue bar and display its count
-            self.canvas.create_rectangle(x0, 550 - elm_height, x0 + 10, 550, fill="#4bc949", outline="#4bc949")
-            self.canvas.create_text(x0 + 5, 550 - elm_height - 10, text=str(elm_count), font=("Arial", 8), fill="green")
-
-            # Draw Hanley Highway bar and display its count
-            self.canvas.create_rectangle(x0 + 15, 550 - hanley_height, x0 + 25, 550, fill="#f9969b", outline="#f9969b")
-            self.canvas.create_text(x0 + 20, 550 - hanley_height - 10, text=str(hanley_count), font=("Arial", 8), fill="red")
-
-            # Label the hour below the bars
-            self.canvas.create_text(x0 + 14, 560, text=f"{hour:02d}", font=("Arial", 8))
+            if elm_label is not None:
+                self.canvas.coords(elm_label, (x0 + x1) / 2, 550 - elm_height - 10)
+                self.canvas.itemconfigure(elm_label, text=str(elm_count))
+                self.canvas.coords(hanley_label, (x2 + x3) / 2, 550 - hanley_height - 10)
+                self.canvas.itemconfigure(hanley_label, text=str(hanley_count))
 
-    def add_legend(self):
+    def step(self, offset):
         """
-        Adds a legend to the histogram to indicate which bar corresponds to which junction.
+        Shows the dataset before or after the current one in date order.
 
-        This function creates two rectangles and two text labels to create a legend
-        for the histogram. The first rectangle and label are for Elm Avenue/Rabbit Road,
-        while the second pair are for Hanley Highway/Westway.
+        Args:
+            offset (int): -1 for the previous date, 1 for the next
         """
-        # Create Elm Avenue/Rabbit Road rectangle and label
-        self.canvas.create_rectangle(650, 100, 670, 120, fill="#4bc949", outline="#4bc949")
-        self.canvas.create_text(700, 110, text="Elm Avenue/Rabbit Road", anchor="w", font=("Arial", 10))
-
-        # Create Hanley Highway/Westway rectangle and label
-        self.canvas.create_rectangle(650, 130, 670, 150, fill="#f9969b", outline="#f9969b")
-        self.canvas.create_text(700, 140, text="Hanley Highway/Westway", anchor="w", font=("Arial", 10))
+        dates = list(self.date_picker["values"])
+        if not dates:
+            return
+        position = dates.index(self.selected.get()) if self.selected.get() in dates else 0
+        self.show(dates[max(0, min(len(dates) - 1, position + offset))])
 
     def run(self):
         """
-        Runs the Tkinter main loop to display the histogram.
-
-        This method calls the methods to set up the window, draw the histogram,
-        and add the legend. Finally, it starts the Tkinter main loop to display
-        the histogram.
+        Shows the window until the user closes it; the window is then hidden, not destroyed.
         """
-        self.setup_window()
-        self.draw_histogram()
-        self.add_legend()
-        # Start the Tkinter main loop to display the histogram
+        self.root.deiconify()
+        self.root.lift()
         self.root.mainloop()
+        self.root.withdraw()
+
+    def close(self):
+        """
+        Destroys the window at the end of the session.
+        """
+        self.root.destroy()
+
+
+def _date_sort_key(label):
+    # DD/MM/YYYY labels sort by date; any other label goes after them in name order
+    try:
+        return (0, datetime.datetime.strptime(label, "%d/%m/%Y"), label)
+    except ValueError:
+        return (1, datetime.datetime.min, label)
+
 
 # Task E: Code Loops to Handle Multiple CSV Files
 class MultiCSVProcessor:
@@ -129,16 +245,18 @@ class MultiCSVProcessor:
         Loads a CSV file and processes its data.
 
         Args:
-            file_path (str): The path to the CSV file to be loaded.
+            file_path (str): The path to the CSV file to be loaded; .csv.gz, .csv.bz2
+                and .csv.zst files are decompressed as they are read.
 
         This method reads the CSV file and stores the data in the current_data
         attribute. The data is stored as a list of dictionaries, where each
         dictionary represents a row in the CSV file. The keys of the dictionary
         are the column names in the CSV file.
         """
-        with open(file_path, mode='r') as file:
+        with open_survey(file_path) as file, timings.stage("load_csv"):
             reader = csv.DictReader(file)
-            self.current_data = list(reader)
+            # Malformed rows are left out of the histogram rather than aborting the load
+            self.current_data = list(RowValidator().clean_rows(reader))
 
     def clear_previous_data(self):
         """
@@ -177,10 +295,12 @@ class MultiCSVProcessor:
         Main loop for handling multiple CSV files until the user decides to quit.
 
         This method clears previous data, handles user input for a new file, and
-        processes the file using the HistogramApp class. The user is then asked
+        shows it in a HistogramViewer that stays open across files, so earlier
+        datasets remain one click away. The user is then asked
         if they want to process another file. If the user enters 'N', the loop
         breaks and the program exits.
         """
+        viewer = None  # One window for every file, created with the first histogram
         while True:
             # Clear previous data
             self.clear_previous_data()
@@ -194,11 +314,17 @@ class MultiCSVProcessor:
                 print("Input cannot be empty.")
                 continue
 
-            # Create a new HistogramApp instance and run it
-            app = HistogramApp(self.current_data, date)
-            app.run()
+            # Add the dataset to the viewer and show it
+            if viewer is None:
+                viewer = HistogramViewer()
+            with timings.stage("histogram"):
+                viewer.add_dataset(date, traffic_data=self.current_data)
+            viewer.run()
 
             # Ask the user if they want to process another file
             continue_input = input("Do you want to process another file? (Y/N): ").strip().upper()
             if continue_input == 'N':
                 break
+
+        if viewer is not None:
+            viewer.close()
@@ -0,0 +1,194 @@
+import contextlib
+import json
+import threading
+import time
+
+# cProfile, pstats and tracemalloc are imported only when a capture mode is enabled,
+# which keeps them out of the start-up path of the CLI and the web app
+
+
+class _Stage:
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.owner._add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# Shared no-op context manager handed out while instrumentation is disabled
+_NULL_STAGE = contextlib.nullcontext()
+
+
+class Instrumentation:
+    def __init__(self):
+        """
+        Collects per-stage timings and counters for a processing run.
+
+        Instrumentation starts disabled; stage() then returns a shared no-op
+        context manager and count() returns immediately, so instrumented code
+        costs nothing measurable until enable() is called.
+        """
+        self.enabled = False
+        self.mode = None
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.profiler = None
+        self.started_at = None
+
+    def enable(self, mode=None):
+        """
+        Turns on timers and counters, optionally with a profiler capture.
+
+        Args:
+            mode (str): None for timers only, "cprofile" for a function-level
+                profile or "tracemalloc" for allocation tracking
+        """
+        if mode not in (None, "cprofile", "tracemalloc"):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.reset()
+        self.enabled = True
+        self.mode = mode
+        self.started_at = time.perf_counter()
+        if mode == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif mode == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start()
+
+    def disable(self):
+        """
+        Stops any running profiler capture and turns instrumentation off.
+        """
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.enabled = False
+
+    def reset(self):
+        """
+        Clears all collected timings, counters and profiler state.
+        """
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+        self.profiler = None
+        if self.mode == "tracemalloc":
+            import tracemalloc
+            tracemalloc.stop()
+
+    def stage(self, name):
+        """
+        Returns a context manager that times the enclosed block under name.
+
+        Args:
+            name (str): Stage name, e.g. "parse" or "save_results"
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, name, value=1):
+        """
+        Adds value to the named counter.
+
+        Args:
+            name (str): Counter name, e.g. "rows" or "bytes"
+            value (int): Amount to add
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _add_time(self, name, elapsed):
+        with self.lock:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += elapsed
+            stage["calls"] += 1
+
+    def report(self, top=15):
+        """
+        Builds a machine-readable summary of everything collected so far.
+
+        Args:
+            top (int): Number of profiler or allocation hotspots to include
+
+        Returns:
+            dict: Stage timings, counters, derived rates and profiler hotspots
+        """
+        with self.lock:
+            stages = {name: dict(values) for name, values in self.stages.items()}
+            counters = dict(self.counters)
+
+        for values in stages.values():
+            values["seconds"] = round(values["seconds"], 6)
+
+        result = {
+            "mode": self.mode or "timers",
+            "wall_seconds": round(time.perf_counter() - self.started_at, 6) if self.started_at else 0,
+            "stages": stages,
+            "counters": counters,
+        }
+
+        # Throughput of the row loop, the figure most regressions show up in
+        parse_seconds = stages.get("parse", {}).get("seconds", 0)
+        if counters.get("rows") and parse_seconds:
+            result["rows_per_sec"] = round(counters["rows"] / parse_seconds)
+        if counters.get("bytes") and parse_seconds:
+            result["bytes_per_sec"] = round(counters["bytes"] / parse_seconds)
+
+        if self.profiler is not None:
+            import io
+            import pstats
+            self.profiler.disable()
+            stats = pstats.Stats(self.profiler, stream=io.StringIO())
+            hotspots = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+            result["hotspots"] = [
+                {
+                    "function": f"{file_name}:{line}({function})",
+                    "calls": calls,
+                    "own_seconds": round(own_time, 6),
+                    "cumulative_seconds": round(cumulative_time, 6),
+                }
+                for (file_name, line, function), (_, calls, own_time, cumulative_time, _) in hotspots
+            ]
+            if self.enabled:
+                self.profiler.enable()
+
+        if self.mode == "tracemalloc":
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            result["allocations"] = {
+                "current_kib": current // 1024,
+                "peak_kib": peak // 1024,
+                "top": [
+                    {"location": str(stat.traceback), "kib": stat.size // 1024, "count": stat.count}
+                    for stat in snapshot.statistics("lineno")[:top]
+                ],
+            }
+
+        return result
+
+    def write_report(self, file_path):
+        """
+        Writes the report as JSON.
+
+        Args:
+            file_path (str): Destination of the JSON report
+        """
+        with open(file_path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+
+
+# Process-wide instance used by the CLI, the GUI and the web app
+timings = Instrumentation()
@@ -1,7 +1,17 @@
+import contextlib
 import csv
 import os
 
-from gui import HistogramApp, MultiCSVProcessor
+from baselines import describe_anomaly, record_day, weekday_name
+from dedup import RowDeduplicator
+from instrumentation import timings
+from results_sink import ResultsSink
+from sketches import QuantileSketch, merge_sketch_groups, speed_percentiles
+from survey_cache import SurveyCache
+from survey_io import find_survey, open_survey
+from rollups import TimeRollups, describe_resolution, resolution_seconds
+from timeparse import parse_date, parse_time_of_day
+from validation import RowValidator, quarantine_path_for
 
 
 def validate_input(prompt, min_val, max_val):
@@ -190,10 +200,11 @@ def validate_continue_input():
 
 
 
-def process_csv_data(file_path, day, month, year):
+def process_csv_data(file_path, day, month, year, deduplicate=False):
     """
     Reads and processes data from the CSV file for a specific date.
     Calculates traffic-related statistics and returns a dictionary of outcomes.
+    With deduplicate set, rows re-sent by overlapping exports are counted once.
     """
 
     #initialize the dictionary for outcomes
@@ -212,6 +223,9 @@ def process_csv_data(file_path, day, month, year):
         "Highest Hourly Count": 0,
         "Most Vehicles Hour": "",
         "Rain Hours": 0,
+        "Rows Quarantined": 0,
+        "Duplicates Removed": 0,
+        "Deduplicated": deduplicate,
         "Date": f"{day:02d}{month:02d}{year}",
         "Data File": os.path.basename(file_path)
     }
@@ -234,20 +248,29 @@ def process_csv_data(file_path, day, month, year):
     scooters = 0
     rainy_hours = set()
     hourly_bicycles = set()
-    hanley_hourly_counts = {}
     total_bicycle_count = 0
+    speed_sketches = {}  # Speed distribution per (junction, hour)
+    minute_counts = {}  # Vehicles per minute of the day at each junction, rolled up to coarser levels below
+    type_counts = {}  # Vehicles per (junction, hour, vehicle type), for the hour-of-week baselines
 
     try:
-        #Open the file and read row by row
-        with open(file_path, mode='r') as file:
+        #Open the file and read row by row; malformed rows go to the quarantine file
+        validator = RowValidator(quarantine_path_for(file_path))
+        deduplicator = RowDeduplicator() if deduplicate else contextlib.nullcontext()
+        with open_survey(file_path) as file, validator, deduplicator, timings.stage("parse"):
             reader = csv.DictReader(file) #Read rows as dictionaries
+            rows = validator.clean_rows(reader)
+            if deduplicate:
+                #Skip rows already seen, e.g. hours re-sent in an overlapping export
+                rows = deduplicator.unique_rows(rows)
 
-            for row in reader:
+            for row in rows:
                 #Extract relevant data from each row
                 vehicle_type = row["VehicleType"]
-                time_of_day = row["timeOfDay"]
-                speed_limit = int(row["JunctionSpeedLimit"])
-                vehicle_speed = int(row["VehicleSpeed"])
+                seconds = parse_time_of_day(row["timeOfDay"])  # Validated time, parsed once per row
+                hour = seconds // 3600
+                speed_limit = row["JunctionSpeedLimit"]
+                vehicle_speed = row["VehicleSpeed"]
                 is_electric = row["electricHybrid"] == "True"
                 junction_name = row["JunctionName"]
                 weather_conditions = row["Weather_Conditions"]
@@ -265,6 +288,12 @@ def process_csv_data(file_path, day, month, year):
                 if junction_name == "Hanley Highway/Westway":
                     hanley_highway_vehicles += 1
 
+                #Count vehicles per minute at this junction; hourly and other counts are summed from these
+                minutes = minute_counts.get(junction_name)
+                if minutes is None:
+                    minutes = minute_counts[junction_name] = TimeRollups.empty_buckets()
+                minutes[seconds // 60] += 1
+
                 #Count trucks
                 if vehicle_type == "Truck":
                     total_trucks += 1
@@ -289,74 +318,91 @@ def process_csv_data(file_path, day, month, year):
                 if vehicle_speed > speed_limit:
                     over_speed_limit += 1
 
+                #Track the speed distribution for this junction and hour
+                sketch = speed_sketches.get((junction_name, hour))
+                if sketch is None:
+                    sketch = speed_sketches[(junction_name, hour)] = QuantileSketch()
+                sketch.update(vehicle_speed)
+
+                #Count vehicles per junction, hour and type
+                type_key = (junction_name, hour, vehicle_type)
+                type_counts[type_key] = type_counts.get(type_key, 0) + 1
+
                 #Count scooters at "Elm Avenue/Rabbit Road"
                 if vehicle_type == "Scooter" and junction_name == "Elm Avenue/Rabbit Road":
                     scooters += 1
 
-                #Count hourly vehicles at "Hanley Highway/Westway"
+                #Count bicycles and rain at "Hanley Highway/Westway"
                 if junction_name == "Hanley Highway/Westway":
-                    hour = time_of_day.split(":")[0]
-                    if hour not in hanley_hourly_counts:
-                        hanley_hourly_counts[hour] = 0
-                    hanley_hourly_counts[hour] += 1
-
                     # Record hourly bicycle counts
                     if vehicle_type == "Bicycle":
-                        hour = time_of_day.split(":")[0]  # Extract the hour
                         hourly_bicycles.add(hour)  # Track unique hours bicycles were recorded
                         total_bicycle_count += 1  # Increment total bicycle count
 
                     # Count rainy hours
-                    date = row["Date"]
-                    time_of_day = row["timeOfDay"]
                     if weather_conditions == "Light Rain" or weather_conditions == "Heavy Rain":
-                        # Extract hour from the time_of_day
-                        hour = time_of_day.split(":")[0]
-                        # Create a unique key for (date, hour)
-                        rainy_hours.add((date, hour))
+                        # Create a unique key for (day ordinal, hour)
+                        rainy_hours.add((parse_date(row["Date"]), hour))
             total_rainy_hours = len(rainy_hours)
                     
-        #Update calculated values into outcomes dictionary
-        outcomes.update({
-            "Total Vehicles": total_vehicles,
-            "Total Trucks": total_trucks,
-            "Total Electric Vehicles": total_electric_vehicles,
-            "Two-Wheeled Vehicles": two_wheeled_vehicles,
-            "Buses North": buses_north,
-            "Straight Through": straight_through,
-            "Over Speed Limit": over_speed_limit,
-            "Elm Ave Rabbit Road": elm_ave_vehicles,
-            "Hanley Highway Westway": hanley_highway_vehicles,
-            "Truck Percentage": round((total_trucks / total_vehicles) * 100) if total_vehicles else 0,
-            "Rain Hours": total_rainy_hours,
-        })
-
-        # Calculate the total number of unique hours for the date
-        unique_hours_in_day = len(set(range(0, 24)))  # 24 hours in a day
-        total_hours = unique_hours_in_day
-
-        average_bicycles_per_hour = round(total_bicycle_count / total_hours) if total_hours > 0 else 0
-        outcomes["Average Bicycles Per Hour"] = average_bicycles_per_hour
-
+        if timings.enabled:
+            timings.count("rows", total_vehicles)
+            timings.count("bytes", os.path.getsize(file_path))
+
+        with timings.stage("summarize"):
+            #Roll the per-minute counts up to 5-minute, 15-minute, hourly and daily counts
+            rollups = TimeRollups(minute_counts)
+
+            #Update calculated values into outcomes dictionary
+            outcomes.update({
+                "Total Vehicles": total_vehicles,
+                "Total Trucks": total_trucks,
+                "Total Electric Vehicles": total_electric_vehicles,
+                "Two-Wheeled Vehicles": two_wheeled_vehicles,
+                "Buses North": buses_north,
+                "Straight Through": straight_through,
+                "Over Speed Limit": over_speed_limit,
+                "Elm Ave Rabbit Road": elm_ave_vehicles,
+                "Hanley Highway Westway": hanley_highway_vehicles,
+                "Truck Percentage": round((total_trucks / total_vehicles) * 100) if total_vehicles else 0,
+                "Rain Hours": total_rainy_hours,
+                "Rows Quarantined": validator.rows_quarantined,
+                "Duplicates Removed": deduplicator.duplicates if deduplicate else 0,
+                "Speed Sketches": speed_sketches,
+                "Hourly Counts": dict(enumerate(rollups.junction_pairs("hour"))),
+                "Time Rollups": rollups,
+                "Type Counts": type_counts,
+            })
+            if validator.rows_quarantined:
+                print(f"{validator.rows_quarantined} malformed rows were skipped and saved to "
+                      f"{validator.quarantine_path}")
+            if outcomes["Duplicates Removed"]:
+                print(f"{outcomes['Duplicates Removed']} duplicate rows were left out")
+
+            # Calculate the total number of unique hours for the date
+            unique_hours_in_day = len(set(range(0, 24)))  # 24 hours in a day
+            total_hours = unique_hours_in_day
+
+            average_bicycles_per_hour = round(total_bicycle_count / total_hours) if total_hours > 0 else 0
+            outcomes["Average Bicycles Per Hour"] = average_bicycles_per_hour
+
+
+            #Calculate scooter percentage at "Elm Avenue/Rabbit Road"
+            if elm_ave_vehicles > 0:#Check if there are any vehicles recorded at "Elm Avenue/Rabbit Road"
+                scooter_percentage = (scooters / elm_ave_vehicles) * 100#Calculate the percentage of scooters relative to total vehicles at this location
+                outcomes["Scooter Percentage"] = int(scooter_percentage) #Store the percentage in the outcomes dictionary, converting it to an integer
+            else:
+                outcomes["Scooter Percentage"] = 0#If no vehicles are recorded, set scooter percentage to 0
 
-        #Calculate scooter percentage at "Elm Avenue/Rabbit Road"
-        if elm_ave_vehicles > 0:#Check if there are any vehicles recorded at "Elm Avenue/Rabbit Road"
-            scooter_percentage = (scooters / elm_ave_vehicles) * 100#Calculate the percentage of scooters relative to total vehicles at this location
-            outcomes["Scooter Percentage"] = int(scooter_percentage) #Store the percentage in the outcomes dictionary, converting it to an integer
-        else:
-            outcomes["Scooter Percentage"] = 0#If no vehicles are recorded, set scooter percentage to 0
-
-        #Calculate highest hourly vehicle count at "Hanley Highway/Westway"
-        if hanley_hourly_counts:#Check if there are hourly counts recorded for "Hanley Highway/Westway"
-            highest_hourly_count = max(hanley_hourly_counts.values())#Find the highest hourly vehicle count at this location
-            outcomes["Highest Hourly Count"] = highest_hourly_count#Store the highest hourly count in the outcomes dictionary
-            most_vehicles_hours = [hour for hour, count in hanley_hourly_counts.items() if count == highest_hourly_count]#Identify the hour(s) during which this highest count occurred
-            #Format the hours into a human-readable string and store in the outcomes dictionary
-            outcomes["Most Vehicles Hour"] = " and ".join(
-                [f"Between {hour}:00 and {int(hour) + 1}:00" for hour in most_vehicles_hours])
+            #Calculate highest hourly vehicle count at "Hanley Highway/Westway" from the hourly rollup
+            if hanley_highway_vehicles:#Check if there are vehicles recorded at "Hanley Highway/Westway"
+                outcomes["Highest Hourly Count"] = rollups.busiest("Hanley Highway/Westway", "hour")[0]
+                #Format the busiest hour(s) into a human-readable string and store in the outcomes dictionary
+                outcomes["Most Vehicles Hour"] = rollups.describe_busiest("Hanley Highway/Westway", "hour")
 
     except Exception as e:#Handle any exceptions that occur during file processing
-        print(f"Error processing file: {e}")#Print an error message        
+        print(f"Error processing file: {e}")#Print an error message
+        return None #Partial counts would be displayed, saved and cached as if the day were complete
 
     return outcomes #Return the processed data
 
@@ -555,66 +601,153 @@ def display_outcomes(outcomes):
     print(f"The highest number of vehicles in an hour on Hanley Highway/Westway is {outcomes['Highest Hourly Count']}")
     print(f"The most vehicles through Hanley Highway/Westway were recorded {outcomes['Most Vehicles Hour']}")
     print(f"The number of hours of rain for this date is {outcomes['Rain Hours']}")
+    for junction, percentiles in junction_speed_percentiles([outcomes.get("Speed Sketches", {})]).items():
+        print(f"Speeds through {junction}: median {percentiles['p50']}, "
+              f"85th percentile {percentiles['p85']}, 95th percentile {percentiles['p95']} mph")
     print("\n***************************************************************\n")
 
 
-def save_results_to_file(outcomes_list):
+def display_busiest_period(outcomes, resolution):
     """
-    Save the processed traffic outcomes to a text file.
-    Appends results if multiple datasets are processed in one session.
+    Prints the busiest period at Hanley Highway/Westway at a resolution other than whole hours.
+
+    Args:
+        outcomes (dict): Dictionary of traffic metrics
+        resolution: Any resolution accepted by rollups.resolution_seconds
     """
-    file_name = "results.txt"  # Define the output file name
-    print("File saved as results.txt")
+    rollups = outcomes.get("Time Rollups")
+    width = resolution_seconds(resolution)
+    if rollups is None or width == 3600:
+        return  # Whole hours are already covered by "Most Vehicles Hour"
     try:
-        # Attempt to open the file in append mode ('a') to add new results without overwriting existing data
-        with open(file_name, "a") as file:
-            # Iterate through each outcome dictionary in the outcomes_list
-            for outcomes in outcomes_list:
-                # Write each outcome to the file
-                file.write(f"Data file selected is {outcomes['Data File']}\n")
-                file.write(f"\nThe total number of vehicles recorded for this date is {outcomes['Total Vehicles']}\n")
-                file.write(f"The total number of trucks recorded for this date is {outcomes['Total Trucks']}\n")
-                file.write(
-                    f"The total number of electric vehicles for this date is {outcomes['Total Electric Vehicles']}\n")
-                file.write(
-                    f"The total number of two-wheeled vehicles for this date is {outcomes['Two-Wheeled Vehicles']}\n")
-                file.write(
-                    f"The total number of Busses leaving Elm Avenue/Rabbit Road heading North is {outcomes['Buses North']}\n")
-                file.write(
-                    f"The total number of Vehicles through both junctions not turning left or right is {outcomes['Straight Through']}\n")
-                file.write(
-                    f"The percentage of total vehicles recorded that are trucks for this date is {outcomes['Truck Percentage']}%\n")
-                file.write(
-                    f"The average number of Bikes per hour for this date is {outcomes['Average Bicycles Per Hour']}\n")
-                file.write(
-                    f"The total number of Vehicles recorded as over the speed limit for this date is {outcomes['Over Speed Limit']}\n")
-                file.write(
-                    f"The total number of vehicles recorded through Elm Avenue/Rabbit Road junction is {outcomes['Elm Ave Rabbit Road']}\n")
-                file.write(
-                    f"The total number of vehicles recorded through Hanley Highway/Westway junction is {outcomes['Hanley Highway Westway']}\n")
-                file.write(
-                    f"{outcomes['Scooter Percentage']}% of vehicles recorded through Elm Avenue/Rabbit Road are scooters\n")
-                file.write(
-                    f"The highest number of vehicles in an hour on Hanley Highway/Westway is {outcomes['Highest Hourly Count']}\n")
-                file.write(
-                    f"The most vehicles through Hanley Highway/Westway were recorded between {outcomes['Most Vehicles Hour']}\n")
-                file.write(f"The number of hours of rain for this date is {outcomes['Rain Hours']}\n")
-                file.write("\n***************************************************************\n")
+        highest, _ = rollups.busiest("Hanley Highway/Westway", width)
+        periods = rollups.describe_busiest("Hanley Highway/Westway", width)
+    except ValueError as e:
+        print(f"Busiest period unavailable: {e}")
+        return
+    if highest:
+        print(f"The busiest {describe_resolution(width).lower()} on Hanley Highway/Westway had "
+              f"{highest} vehicles, {periods[0].lower()}{periods[1:]}")
 
-    except Exception as e:
-        # Handle errors during file writing
-        print(f"Error saving results: {e}")
 
+def junction_speed_percentiles(sketch_groups):
+    """
+    Combines per-(junction, hour) speed sketches into percentiles per junction.
+
+    Args:
+        sketch_groups (list): "Speed Sketches" mappings from one or more processed files
+
+    Returns:
+        dict: Maps each junction to its p50/p85/p95 speeds
+    """
+    # Drop the hour from the key so every hour of every file folds into one sketch per junction
+    by_junction = merge_sketch_groups(
+        {junction: sketch} for group in sketch_groups for (junction, _), sketch in group.items())
+    return {junction: speed_percentiles(sketch) for junction, sketch in sorted(by_junction.items())}
+
+
+# Anomalies printed per day; the rest are summarised in one line
+MAX_ANOMALIES_SHOWN = 10
+
+
+def display_anomalies(cache, outcomes, day, month, year):
+    """
+    Flags the day's hourly counts against the hour-of-week baselines and prints any anomalies.
+
+    Args:
+        cache (SurveyCache): Cache of the drop directory, which also holds the baselines
+        outcomes (dict): Outcomes returned by process_csv_data
+        day (int): Day of the survey
+        month (int): Month of the survey
+        year (int): Year of the survey
+    """
+    try:
+        anomalies = record_day(cache.baseline_path(), outcomes, day, month, year)
+    except (OSError, ValueError) as e:
+        print(f"Could not update the hour-of-week baselines: {e}")
+        return
+
+    if anomalies:
+        print(f"Unusual hourly counts compared with earlier {weekday_name(day, month, year)}s:")
+        for anomaly in anomalies[:MAX_ANOMALIES_SHOWN]:
+            print(f"  {describe_anomaly(anomaly)}")
+        if len(anomalies) > MAX_ANOMALIES_SHOWN:
+            print(f"  ...and {len(anomalies) - MAX_ANOMALIES_SHOWN} more")
+
+
+def store_in_cache(cache, file_name, outcomes):
+    """
+    Saves processed outcomes so the next query for the same day is instant.
+
+    Args:
+        cache (SurveyCache): Cache of processed survey days
+        file_name (str): The survey file the outcomes came from
+        outcomes (dict): Outcomes returned by process_csv_data
+    """
+    try:
+        cache.put(file_name, outcomes)
+    except OSError as e:
+        # A read-only folder only costs the speed-up, not the results
+        print(f"Could not cache results for {file_name}: {e}")
+
+
+def _resolution_argument(text):
+    # Rejects an unusable resolution while the arguments are parsed, not after the first file
+    import argparse
+
+    try:
+        resolution_seconds(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return text
+
+
+def parse_arguments(argv=None):
+    """
+    Parses the command-line options of the program.
+
+    Args:
+        argv (list): Arguments to parse; defaults to sys.argv
+
+    Returns:
+        argparse.Namespace: The parsed options
+    """
+    import argparse  # Only needed when the program runs as a command
+
+    parser = argparse.ArgumentParser(description="Traffic Data Analysis Program")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each processing stage and write a timing report")
+    parser.add_argument("--profile-mode", choices=["cprofile", "tracemalloc"],
+                        help="also capture a cProfile profile or tracemalloc allocations (implies --profile)")
+    parser.add_argument("--profile-report", default="timing_report.json",
+                        help="where to write the timing report (default: timing_report.json)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="count rows repeated by overlapping exports only once")
+    parser.add_argument("--resolution", type=_resolution_argument, default="hour",
+                        help="time buckets for the histogram and busiest period: 1min, 5min, 15min, "
+                             "hour, day or any number of minutes that divides a day (default: hour)")
+    return parser.parse_args(argv)
 
 
 # Main Function
-def main():
+def main(argv=None):
+    args = parse_arguments(argv)
+    # tkinter is only loaded for the interactive program, not when process_csv_data is imported
+    from gui import HistogramViewer
+
+    if args.profile or args.profile_mode:
+        timings.enable(args.profile_mode)
+
     print("*********************************************\n"
           "\tTraffic Data Analysis Program\n"
           "*********************************************\n")
 
     outcomes_list = []  # Store results for multiple files
-    processor = MultiCSVProcessor()  # Object to handle multiple CSV files
+    # Results are flushed after every processed file so a crash keeps earlier work
+    sinks = [ResultsSink("results.txt"), ResultsSink("results.csv")]
+    # Days ingested by watcher.py, or processed in an earlier session, are answered from here
+    cache = SurveyCache.for_directory(".")
+    viewer = None  # Histogram window shared by every file, created with the first histogram
 
     while True:
         # Get the survey date from the user with error handling
@@ -624,28 +757,46 @@ def main():
             print(f"Invalid date input: {e}. Please try again.")
             continue
 
-        # Generate the expected CSV file name
-        file_name = f"traffic_data{day:02}{month:02}{year}.csv"
+        # Generate the expected CSV file name, falling back to a compressed copy of it
+        file_name = find_survey(f"traffic_data{day:02}{month:02}{year}.csv")
 
         try:
-            # Load CSV file using MultiCSVProcessor
-            processor.load_csv_file(file_name)
+            outcomes = cache.get(file_name, deduplicated=args.dedup)
+            if outcomes is not None:
+                print(f"Using cached results for {file_name}")
+            elif not os.path.exists(file_name):
+                raise FileNotFoundError(file_name)
 
             # Task B: Process CSV Data
             try:
-                outcomes = process_csv_data(file_name, day, month, year)
-                if outcomes:
-                    # Add outcomes to the list and display them
-                    outcomes_list.append(outcomes)
-                    display_outcomes(outcomes)
+                if outcomes is None:
+                    outcomes = process_csv_data(file_name, day, month, year, deduplicate=args.dedup)
+                    if not outcomes:
+                        print(f"No results for {file_name}. Skipping this file.")
+                        continue
+                    store_in_cache(cache, file_name, outcomes)
+                # Add outcomes to the list and display them
+                outcomes_list.append(outcomes)
+                display_outcomes(outcomes)
+                display_busiest_period(outcomes, args.resolution)
+                display_anomalies(cache, outcomes, day, month, year)
+                with timings.stage("save_results"):
+                    for sink in sinks:
+                        sink.write(outcomes)
+                        sink.flush()
             except Exception as e:
                 print(f"Error processing CSV data: {e}. Skipping this file.")
                 continue
 
-            # Task D: Display Histogram using HistogramApp
+            # Task D: Display Histogram using HistogramViewer
             try:
-                app = HistogramApp(processor.current_data, f"{day:02d}/{month:02d}/{year}")
-                app.run()
+                if viewer is None:
+                    viewer = HistogramViewer(args.resolution)
+                with timings.stage("histogram"):
+                    # The counts come rolled up with the outcomes, so the rows are not walked again
+                    viewer.add_dataset(f"{day:02d}/{month:02d}/{year}", hourly_data=outcomes.get("Hourly Counts"),
+                                       rollups=outcomes.get("Time Rollups"))
+                viewer.run()
             except Exception as e:
                 print(f"Error displaying histogram: {e}. Skipping this file.")
                 continue
@@ -662,12 +813,29 @@ def main():
             print("Invalid input. Please enter 'Y' for yes or 'N' for no.")
             continue
 
-    # Save results with error handling
+    # Speed percentiles across every file of the session, merged from the per-file sketches
+    if len(outcomes_list) > 1:
+        print("Speed percentiles across all processed files:")
+        session_sketches = [outcomes["Speed Sketches"] for outcomes in outcomes_list]
+        for junction, percentiles in junction_speed_percentiles(session_sketches).items():
+            print(f"  {junction}: median {percentiles['p50']}, "
+                  f"85th percentile {percentiles['p85']}, 95th percentile {percentiles['p95']} mph")
+
+    # Save any results still buffered with error handling
     try:
-        save_results_to_file(outcomes_list)
+        for sink in sinks:
+            sink.close()
+        print("Results saved to results.txt and results.csv")
     except IOError as e:
         print(f"Error saving results to file: {e}. Please check your file permissions and try again.")
 
+    if viewer is not None:
+        viewer.close()
+
+    if timings.enabled:
+        timings.write_report(args.profile_report)
+        print(f"Timing report saved as {args.profile_report}")
+
 
 
 # Entry point of the program
@@ -0,0 +1,218 @@
+import atexit
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+
+# Folder shared by every gunicorn worker; each worker keeps its own file in it
+METRICS_DIR = os.environ.get("TRAFFIC_METRICS_DIR", "/tmp/traffic_metrics")
+
+# Longest a worker keeps changes in memory before writing its file; /metrics writes at once
+SAVE_INTERVAL = 1.0
+
+# Histogram definitions: metric name -> (help text, bucket upper bounds)
+HISTOGRAMS = {
+    "traffic_request_duration_seconds": (
+        "Time spent handling /submit requests",
+        [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+    ),
+    "traffic_upload_size_bytes": (
+        "Size of uploaded survey files",
+        [1e4, 1e5, 1e6, 1e7, 1e8, 1e9],
+    ),
+    "traffic_parse_duration_seconds": (
+        "Time spent reading and counting survey rows",
+        [0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30],
+    ),
+    "traffic_rows_processed": (
+        "Rows processed per survey file",
+        [100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8],
+    ),
+    "traffic_outcome_duration_seconds": (
+        "Time spent computing outcomes from the counted rows",
+        [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1],
+    ),
+}
+
+# Counter definitions: metric name -> help text
+COUNTERS = {
+    "traffic_uploads_total": "Survey files uploaded",
+    "traffic_cache_hits_total": "Uploads answered from the outcome cache",
+    "traffic_cache_misses_total": "Uploads that had to be processed",
+    "traffic_errors_total": "Failed uploads, by reason",
+}
+
+
+class WorkerMetrics:
+    def __init__(self, metrics_dir=METRICS_DIR, save_interval=SAVE_INTERVAL):
+        """
+        Holds the metrics of one worker process and mirrors them to disk.
+
+        Each process writes its own JSON file, named after its pid and start
+        time, so that render() can add up counters and histograms across all
+        gunicorn workers, including workers that have since been restarted,
+        without a new worker that reuses a pid replacing the old one's file.
+        Changes are written in batches, at most save_interval seconds after
+        they happen, and whenever the worker serves a scrape.
+
+        Args:
+            metrics_dir (str): Folder shared by all worker processes
+            save_interval (float): Seconds a change may wait before it is written
+        """
+        self.metrics_dir = metrics_dir
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.pid = None
+        self.file_path = None
+        self.counters = {}
+        self.histograms = {}
+        self.dirty = False
+        self.timer = None
+
+    def _check_pid(self):
+        # Workers forked from a preloaded master must not share the master's file
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.file_path = os.path.join(self.metrics_dir, f"worker_{self.pid}_{time.time_ns()}.json")
+            self.counters = {}
+            self.histograms = {}
+            self.dirty = False
+            self.timer = None  # The master's timer thread did not survive the fork
+
+    def _changed(self):
+        # Schedules one write for every change made in the next save_interval seconds
+        self.dirty = True
+        if self.timer is None:
+            self.timer = threading.Timer(self.save_interval, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds value to a counter.
+
+        Args:
+            name (str): Counter name from COUNTERS
+            value (int): Amount to add
+            labels: Optional label values, e.g. reason="parse"
+        """
+        key = _series_key(name, labels)
+        with self.lock:
+            self._check_pid()
+            self.counters[key] = self.counters.get(key, 0) + value
+            self._changed()
+
+    def observe(self, name, value):
+        """
+        Records one observation in a histogram.
+
+        Args:
+            name (str): Histogram name from HISTOGRAMS
+            value (float): Observed value
+        """
+        bounds = HISTOGRAMS[name][1]
+        with self.lock:
+            self._check_pid()
+            histogram = self.histograms.setdefault(
+                name, {"buckets": [0] * len(bounds), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(bounds):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+            self._changed()
+
+    def flush(self):
+        """
+        Writes this worker's file now if anything changed since the last write.
+        """
+        with self.lock:
+            self._check_pid()
+            if self.timer is not None and self.timer is not threading.current_thread():
+                self.timer.cancel()
+            self.timer = None
+            if self.dirty:
+                self._save()
+                self.dirty = False
+
+    def _save(self):
+        import tempfile
+
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        payload = json.dumps({"counters": self.counters, "histograms": self.histograms})
+        fd, temp_path = tempfile.mkstemp(dir=self.metrics_dir, prefix=".metrics-")
+        with os.fdopen(fd, "w") as file:
+            file.write(payload)
+        os.replace(temp_path, self.file_path)
+
+    def render(self):
+        """
+        Renders the metrics of all workers in the Prometheus text format.
+
+        Returns:
+            str: The exposition text served from /metrics
+        """
+        self.flush()
+        counters = {}
+        histograms = {}
+        for path in glob.glob(os.path.join(self.metrics_dir, "worker_*.json")):
+            try:
+                with open(path, "r") as file:
+                    stored = json.load(file)
+            except (OSError, ValueError):
+                continue  # A worker file that vanished or is mid-write is picked up next scrape
+            for key, value in stored["counters"].items():
+                counters[key] = counters.get(key, 0) + value
+            for name, values in stored["histograms"].items():
+                total = histograms.setdefault(
+                    name, {"buckets": [0] * len(values["buckets"]), "sum": 0.0, "count": 0})
+                total["buckets"] = [a + b for a, b in zip(total["buckets"], values["buckets"])]
+                total["sum"] += values["sum"]
+                total["count"] += values["count"]
+
+        lines = []
+        for name, help_text in COUNTERS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            series = {key: value for key, value in counters.items() if key.split("{")[0] == name}
+            if not series:
+                series = {name: 0}
+            for key, value in sorted(series.items()):
+                lines.append(f"{key} {value}")
+
+        for name, (help_text, bounds) in HISTOGRAMS.items():
+            values = histograms.get(name, {"buckets": [0] * len(bounds), "sum": 0.0, "count": 0})
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for bound, count in zip(bounds, values["buckets"]):
+                lines.append(f'{name}_bucket{{le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {values["count"]}')
+            # repr keeps every digit; :g would round large sums to six significant figures
+            lines.append(f"{name}_sum {float(values['sum'])!r}")
+            lines.append(f"{name}_count {values['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def clear_metrics_dir(metrics_dir=METRICS_DIR):
+    """
+    Deletes the files of every earlier server run, so counters start again from zero.
+
+    Called once per server start, before any worker exists, e.g. from the
+    on_starting hook in gunicorn.conf.py.
+    """
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def _series_key(name, labels):
+    if not labels:
+        return name
+    label_text = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return f"{name}{{{label_text}}}"
+
+
+# Metrics of the current worker process
+metrics = WorkerMetrics()
+atexit.register(metrics.flush)  # Changes from the last save_interval of a worker that shuts down
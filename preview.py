@@ -0,0 +1,223 @@
+import csv
+import math
+import os
+import random
+import time
+
+from survey_io import MAX_LINE_BYTES, compression_of, iter_decompressed
+from timeparse import hour_of
+
+# Compressed bytes decompressed per step when sampling a compressed file
+COMPRESSED_SAMPLE_CHUNK = 16 * 1024
+
+# z value for a 95% confidence interval
+Z_95 = 1.96
+
+
+def _read_blocks(file_path, block_rows, max_blocks, time_budget, seed, total_size):
+    # Reads blocks of consecutive rows starting at random byte offsets, within the time budget.
+    # Returns the fields, the blocks, the data bytes of the whole file and how it was sampled
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    file_size = os.path.getsize(file_path)
+    truncated = total_size is not None and total_size > file_size
+
+    # A compressed stream cannot be entered at a random offset, so it is sampled from the start
+    if compression_of(file_path):
+        return _read_compressed_blocks(file_path, block_rows, max_blocks, time_budget, started,
+                                       total_size if truncated else None)
+
+    with open(file_path, mode='rb') as file:
+        header = file.readline()
+        data_start = file.tell()
+        data_bytes = (total_size if truncated else file_size) - data_start
+        fieldnames = next(csv.reader([header.decode()]))
+        if truncated:
+            # The upload stops part way through a row; sample only the rows it holds whole
+            file.seek(max(data_start, file_size - MAX_LINE_BYTES))
+            file_size = file.tell() + file.read().rfind(b"\n") + 1
+            file.seek(data_start)
+
+        # Small files are read whole, which makes the preview exact
+        if file_size - data_start <= block_rows * max_blocks * 80:
+            lines = file.read(file_size - data_start).decode().splitlines()
+            return fieldnames, [lines], data_bytes, "head" if truncated else "whole"
+
+        blocks = []
+        offsets = sorted(rng.randrange(data_start, file_size) for _ in range(max_blocks))
+        for offset in offsets:
+            if time.perf_counter() - started > time_budget and len(blocks) >= 2:
+                break
+            file.seek(offset)
+            file.readline()  # Skip the partial line the offset landed in
+            lines = []
+            for _ in range(block_rows):
+                if file.tell() >= file_size:
+                    break
+                line = file.readline()
+                if not line:
+                    break
+                lines.append(line.decode().rstrip("\r\n"))
+            if lines:
+                blocks.append(lines)
+        return fieldnames, blocks, data_bytes, "head" if truncated else "random"
+
+
+def _read_compressed_blocks(file_path, block_rows, max_blocks, time_budget, started, total_size):
+    # Reads consecutive blocks from the start of a compressed file, up to the same row cap and
+    # time budget as the random blocks of a plain file, so a large archive is never inflated whole.
+    # total_size is the size of the whole archive when file_path holds only its first bytes
+    wanted_rows = block_rows * max_blocks + 1
+    lines = []
+    pending = b""
+    consumed = produced = 0
+    chunks = iter_decompressed(file_path, COMPRESSED_SAMPLE_CHUNK)
+    try:
+        for consumed, output in chunks:
+            produced += len(output)
+            *complete, pending = (pending + output).split(b"\n")
+            lines.extend(line.decode().rstrip("\r") for line in complete)
+            if len(pending) > MAX_LINE_BYTES:
+                raise ValueError("The file has no line breaks where survey rows should be")
+            if len(lines) >= wanted_rows:
+                break
+            if time.perf_counter() - started > time_budget and len(lines) > 2 * block_rows:
+                break
+        else:
+            if pending:
+                lines.append(pending.decode().rstrip("\r"))
+            consumed = None  # Reached the end: the preview is exact
+    except EOFError:
+        if total_size is None:
+            raise
+        # The upload holds only the start of the archive; the row cut off at its end is dropped
+    finally:
+        chunks.close()
+    if not lines:
+        raise ValueError("The file is empty")
+
+    header, rows = lines[0], lines[1:wanted_rows]
+    blocks = [rows[start:start + block_rows] for start in range(0, len(rows), block_rows)]
+    if consumed is None:
+        return next(csv.reader([header])), blocks, sum(len(line) + 1 for line in rows), "whole"
+
+    # The decompressed size is the compressed size times the compression ratio seen so far. Output
+    # is counted against the small chunk that released it, since bz2 only emits whole blocks
+    compressed_size = total_size or os.path.getsize(file_path)
+    data_bytes = round(compressed_size * produced / max(1, consumed)) - len(header) - 1
+    return next(csv.reader([header])), blocks, data_bytes, "head"
+
+
+def _ratio_interval(numerators, denominators):
+    # 95% interval of sum(numerators) / sum(denominators), treating each block as one cluster
+    total_num = sum(numerators)
+    total_den = sum(denominators)
+    if total_den == 0:
+        return 0.0, 0.0
+    ratio = total_num / total_den
+    blocks = len(denominators)
+    if blocks < 2:
+        return ratio, 0.0
+    mean_den = total_den / blocks
+    residuals = sum(((num - ratio * den) / mean_den) ** 2 for num, den in zip(numerators, denominators))
+    standard_error = math.sqrt(residuals / (blocks * (blocks - 1)))
+    return ratio, Z_95 * standard_error
+
+
+def estimate_outcomes(file_path, block_rows=50, max_blocks=200, time_budget=0.2, seed=0, total_size=None):
+    """
+    Estimates headline outcomes from a random sample of rows.
+
+    Blocks of consecutive rows are read from random byte offsets, so the cost
+    depends on the sample size and not on the file size. Each estimate comes
+    with a 95% confidence interval that treats every block as one cluster.
+    Compressed files cannot be entered at random offsets, and a file cut
+    short by the upload form holds only its first rows; both are sampled
+    from the start (Sample is "head"). Those rows are not a random sample of
+    the day, so their estimates carry no margin.
+
+    Args:
+        file_path (str): Path of the survey file
+        block_rows (int): Rows read from each random offset
+        max_blocks (int): Maximum number of blocks to read
+        time_budget (float): Seconds after which no further blocks are read
+        seed (int): Seed for choosing the offsets
+        total_size (int): Size of the whole file when file_path holds only its first bytes
+
+    Returns:
+        dict: Estimates as {"value": ..., "margin": ...} pairs, with margin
+        None for a head sample, plus the sample size, how the rows were
+        sampled ("whole", "random" or "head") and whether the whole file was read
+    """
+    fieldnames, blocks, data_bytes, sample = _read_blocks(
+        file_path, block_rows, max_blocks, time_budget, seed, total_size)
+    exact = sample == "whole"
+
+    junction_index = fieldnames.index("JunctionName")
+    type_index = fieldnames.index("VehicleType")
+    time_index = fieldnames.index("timeOfDay")
+
+    rows_per_block = []
+    bytes_per_block = []
+    trucks_per_block = []
+    hanley_hours_per_block = []
+    for lines in blocks:
+        rows = 0
+        trucks = 0
+        hanley_hours = [0] * 24
+        for row in csv.reader(lines):
+            try:
+                hour = hour_of(row[time_index])
+            except (IndexError, ValueError):
+                continue  # Malformed rows are left to the full pass to quarantine
+            rows += 1
+            if row[type_index] == "Truck":
+                trucks += 1
+            if row[junction_index] == "Hanley Highway/Westway":
+                hanley_hours[hour] += 1
+        rows_per_block.append(rows)
+        # Each line also carries its newline byte
+        bytes_per_block.append(sum(len(line) + 1 for line in lines))
+        trucks_per_block.append(trucks)
+        hanley_hours_per_block.append(hanley_hours)
+
+    sampled_rows = sum(rows_per_block)
+
+    # Rows in the file = data bytes x rows per sampled byte
+    rows_per_byte, rows_per_byte_margin = _ratio_interval(rows_per_block, bytes_per_block)
+    total_vehicles = rows_per_byte * data_bytes
+    total_margin = rows_per_byte_margin * data_bytes
+
+    truck_share, truck_margin = _ratio_interval(trucks_per_block, rows_per_block)
+
+    # Peak Hanley hour: the hour with the largest estimated share of all rows
+    peak_hour = max(range(24), key=lambda hour: sum(block[hour] for block in hanley_hours_per_block))
+    peak_share, peak_margin = _ratio_interval(
+        [block[peak_hour] for block in hanley_hours_per_block], rows_per_block)
+
+    if exact:
+        total_vehicles = sampled_rows
+        total_margin = truck_margin = peak_margin = 0.0
+
+    # Relative errors of the share and of the row total combine in quadrature
+    peak_count = peak_share * total_vehicles
+    peak_count_margin = 0.0
+    if peak_share and total_vehicles:
+        peak_count_margin = peak_count * math.sqrt(
+            (peak_margin / peak_share) ** 2 + (total_margin / total_vehicles) ** 2)
+
+    def margin(value):
+        return None if sample == "head" else value
+
+    return {
+        "Exact": exact,
+        "Sample": sample,
+        "Sampled Rows": sampled_rows,
+        "Total Vehicles": {"value": round(total_vehicles), "margin": margin(round(total_margin))},
+        "Truck Percentage": {"value": round(truck_share * 100, 1), "margin": margin(round(truck_margin * 100, 1))},
+        "Most Vehicles Hour": f"Between {peak_hour:02d}:00 and {peak_hour + 1}:00",
+        "Highest Hourly Count": {
+            "value": round(peak_count),
+            "margin": margin(round(peak_count_margin)),
+        },
+    }
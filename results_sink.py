@@ -0,0 +1,226 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+
+# Columns written for every outcome row, in the order they are displayed
+RESULT_FIELDS = [
+    "Date",
+    "Data File",
+    "Total Vehicles",
+    "Total Trucks",
+    "Total Electric Vehicles",
+    "Two-Wheeled Vehicles",
+    "Buses North",
+    "Straight Through",
+    "Truck Percentage",
+    "Average Bicycles Per Hour",
+    "Over Speed Limit",
+    "Elm Ave Rabbit Road",
+    "Hanley Highway Westway",
+    "Scooter Percentage",
+    "Highest Hourly Count",
+    "Most Vehicles Hour",
+    "Rain Hours",
+    "Rows Quarantined",
+    "Duplicates Removed",
+    "Deduplicated",
+]
+
+# Output format chosen from the file extension when none is given
+FORMAT_EXTENSIONS = {
+    ".txt": "text",
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".json": "columnar",
+}
+
+
+def format_outcomes_text(outcomes):
+    """
+    Formats one outcome dictionary as the human-readable block used in results.txt.
+
+    Args:
+        outcomes (dict): Dictionary of traffic metrics
+
+    Returns:
+        str: The formatted block, including the trailing separator line
+    """
+    return (
+        f"Data file selected is {outcomes['Data File']}\n"
+        f"\nThe total number of vehicles recorded for this date is {outcomes['Total Vehicles']}\n"
+        f"The total number of trucks recorded for this date is {outcomes['Total Trucks']}\n"
+        f"The total number of electric vehicles for this date is {outcomes['Total Electric Vehicles']}\n"
+        f"The total number of two-wheeled vehicles for this date is {outcomes['Two-Wheeled Vehicles']}\n"
+        f"The total number of Busses leaving Elm Avenue/Rabbit Road heading North is {outcomes['Buses North']}\n"
+        f"The total number of Vehicles through both junctions not turning left or right is {outcomes['Straight Through']}\n"
+        f"The percentage of total vehicles recorded that are trucks for this date is {outcomes['Truck Percentage']}%\n"
+        f"The average number of Bikes per hour for this date is {outcomes['Average Bicycles Per Hour']}\n"
+        f"The total number of Vehicles recorded as over the speed limit for this date is {outcomes['Over Speed Limit']}\n"
+        f"The total number of vehicles recorded through Elm Avenue/Rabbit Road junction is {outcomes['Elm Ave Rabbit Road']}\n"
+        f"The total number of vehicles recorded through Hanley Highway/Westway junction is {outcomes['Hanley Highway Westway']}\n"
+        f"{outcomes['Scooter Percentage']}% of vehicles recorded through Elm Avenue/Rabbit Road are scooters\n"
+        f"The highest number of vehicles in an hour on Hanley Highway/Westway is {outcomes['Highest Hourly Count']}\n"
+        f"The most vehicles through Hanley Highway/Westway were recorded between {outcomes['Most Vehicles Hour']}\n"
+        f"The number of hours of rain for this date is {outcomes['Rain Hours']}\n"
+        "\n***************************************************************\n"
+    )
+
+
+class ResultsSink:
+    def __init__(self, file_path, fmt=None, buffer_size=500):
+        """
+        Buffers outcome rows in memory and writes them to disk in batches.
+
+        Text, CSV and JSON Lines batches are appended in one O_APPEND write
+        and fsynced, so a flush costs the size of the batch, not of the file.
+        The columnar file is one JSON document, so each flush rewrites it
+        through a temporary file and os.replace, leaving either the previous
+        file or the new one after a crash. An existing CSV file whose header
+        lacks some of RESULT_FIELDS is rewritten once with the missing
+        columns added, so new rows never land under the wrong heading.
+
+        Args:
+            file_path (str): Path of the results file
+            fmt (str): One of "text", "csv", "jsonl" or "columnar". Inferred
+                from the file extension when not given.
+            buffer_size (int): Number of buffered rows that triggers a flush
+        """
+        if fmt is None:
+            extension = os.path.splitext(file_path)[1].lower()
+            fmt = FORMAT_EXTENSIONS.get(extension)
+        if fmt not in ("text", "csv", "jsonl", "columnar"):
+            raise ValueError(f"Unsupported results format for {file_path}: {fmt}")
+
+        self.file_path = file_path
+        self.fmt = fmt
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.rows_written = 0
+
+    def write(self, outcomes):
+        """
+        Adds one outcome dictionary to the buffer, flushing when it is full.
+
+        Args:
+            outcomes (dict): Dictionary of traffic metrics
+        """
+        self.buffer.append({field: outcomes.get(field, "") for field in RESULT_FIELDS})
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered rows to the results file and syncs it to disk.
+        """
+        if not self.buffer:
+            return
+
+        if self.fmt == "columnar":
+            self._replace(self._render_columnar())
+        elif self.fmt == "csv":
+            self._flush_csv()
+        else:
+            self._append(self._render_rows())
+
+        self.rows_written += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        """
+        Flushes any remaining buffered rows.
+        """
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _existing_size(self):
+        try:
+            return os.path.getsize(self.file_path)
+        except OSError:
+            return 0
+
+    def _render_rows(self, fieldnames=RESULT_FIELDS, header=False):
+        # Render the whole batch into one string so it reaches the disk in a single write
+        out = io.StringIO()
+        if self.fmt == "text":
+            for outcomes in self.buffer:
+                out.write(format_outcomes_text(outcomes))
+        elif self.fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=fieldnames, restval="", lineterminator="\n")
+            if header:
+                writer.writeheader()
+            writer.writerows(self.buffer)
+        else:
+            for outcomes in self.buffer:
+                out.write(json.dumps(outcomes))
+                out.write("\n")
+        return out.getvalue()
+
+    def _flush_csv(self):
+        if self._existing_size() == 0:
+            self._append(self._render_rows(header=True))
+            return
+        with open(self.file_path, "r", newline="") as file:
+            stored_fields = next(csv.reader(file), [])
+        missing = [field for field in RESULT_FIELDS if field not in stored_fields]
+        if not missing:
+            # Rows follow the file's own column order, whatever order RESULT_FIELDS has now
+            self._append(self._render_rows(stored_fields))
+            return
+
+        # Fields added after the file was started: rewrite it once with them as extra columns
+        fieldnames = stored_fields + missing
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=fieldnames, restval="", lineterminator="\n")
+        writer.writeheader()
+        with open(self.file_path, "r", newline="") as file:
+            writer.writerows(csv.DictReader(file))
+        self._replace(out.getvalue() + self._render_rows(fieldnames))
+
+    def _render_columnar(self):
+        # Column-oriented layout: one list of values per field, extended on each flush
+        columns = {field: [] for field in RESULT_FIELDS}
+        if self._existing_size() > 0:
+            with open(self.file_path, "r") as file:
+                stored = json.load(file)
+            stored_rows = max((len(values) for values in stored["data"].values()), default=0)
+            for field in RESULT_FIELDS:
+                # Fields added after the file was started are padded for the earlier rows
+                columns[field] = stored["data"].get(field, [""] * stored_rows)
+        for outcomes in self.buffer:
+            for field in RESULT_FIELDS:
+                columns[field].append(outcomes[field])
+        return json.dumps({"columns": RESULT_FIELDS, "data": columns})
+
+    def _append(self, payload):
+        fd = os.open(self.file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            data = payload.encode()
+            while data:
+                data = data[os.write(fd, data):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _replace(self, payload):
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".results-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as temp_file:
+                temp_file.write(payload)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            # mkstemp creates owner-only files; keep the usual results file permissions
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self.file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
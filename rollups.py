@@ -0,0 +1,210 @@
+import re
+
+# Named resolutions and their bucket width in seconds, finest first
+RESOLUTIONS = {
+    "1min": 60,
+    "5min": 300,
+    "15min": 900,
+    "hour": 3600,
+    "day": 86400,
+}
+
+# Width of the buckets filled during ingest; every coarser level is summed from them
+BASE_WIDTH = RESOLUTIONS["1min"]
+
+SECONDS_PER_DAY = 86400
+
+# The two junctions drawn side by side in the histograms
+JUNCTIONS = ("Elm Avenue/Rabbit Road", "Hanley Highway/Westway")
+
+# Resolutions written as a number of minutes, e.g. "30min" or "30"
+_MINUTES = re.compile(r"^(\d+)\s*(min)?$")
+
+
+def resolution_seconds(resolution):
+    """
+    Converts a resolution to its bucket width in seconds.
+
+    Args:
+        resolution: A name from RESOLUTIONS, a whole number of minutes
+            written as text such as "30" or "30min", or a width in seconds
+            given as an int
+
+    Returns:
+        int: The bucket width in seconds
+
+    Raises:
+        ValueError: If the resolution is unknown or does not divide a day into whole buckets
+    """
+    if isinstance(resolution, int):
+        width = resolution
+    elif resolution in RESOLUTIONS:
+        width = RESOLUTIONS[resolution]
+    else:
+        match = _MINUTES.match(str(resolution).strip().lower())
+        if not match:
+            raise ValueError(f"Unknown resolution: {resolution!r}")
+        width = int(match.group(1)) * 60
+    if width <= 0 or width % 60 or SECONDS_PER_DAY % width:
+        raise ValueError(f"Resolution {resolution!r} does not divide a day into whole buckets")
+    return width
+
+
+def describe_resolution(width):
+    """
+    Names a bucket width for display, e.g. "Hour" or "15 Minutes".
+    """
+    if width == SECONDS_PER_DAY:
+        return "Day"
+    if width == 3600:
+        return "Hour"
+    if width % 3600 == 0:
+        return f"{width // 3600} Hours"
+    return f"{width // 60} Minute" if width == 60 else f"{width // 60} Minutes"
+
+
+def describe_period(start, width):
+    """
+    Formats one bucket the way "Most Vehicles Hour" always has, e.g. "Between 08:00 and 9:00".
+
+    Args:
+        start (int): Start of the bucket in seconds since midnight
+        width (int): Bucket width in seconds
+    """
+    end = start + width
+    return f"Between {start // 3600:02d}:{start // 60 % 60:02d} and {end // 3600}:{end // 60 % 60:02d}"
+
+
+class TimeRollups:
+    def __init__(self, counts, width=BASE_WIDTH):
+        """
+        Vehicle counts per junction at several time resolutions.
+
+        Ingest fills one list of counts per junction at the finest width (one
+        minute). The 5-minute, 15-minute, hourly and daily levels are then
+        summed from the level below them, never from the rows, so asking for
+        any of them costs a dictionary lookup. Other whole-minute widths are
+        summed on first use from the coarsest stored level that divides them.
+
+        Args:
+            counts (dict): Junction name -> list of counts, one per bucket of the day
+            width (int): Bucket width of counts in seconds
+        """
+        self.width = width
+        self.levels = {width: counts}  # Bucket width -> {junction: counts}
+        finer = width
+        for coarser in RESOLUTIONS.values():
+            if coarser > finer and coarser % finer == 0:
+                self.levels[coarser] = self._sum_level(self.levels[finer], coarser // finer)
+                finer = coarser
+
+    @staticmethod
+    def _sum_level(counts, factor):
+        # Adds each run of factor neighbouring buckets into one bucket
+        return {junction: [sum(buckets[start:start + factor]) for start in range(0, len(buckets), factor)]
+                for junction, buckets in counts.items()}
+
+    @staticmethod
+    def empty_buckets(width=BASE_WIDTH):
+        """
+        Returns a zeroed list of counts for one junction, for ingest to fill.
+        """
+        return [0] * (SECONDS_PER_DAY // width)
+
+    def counts(self, resolution="hour"):
+        """
+        Returns the counts of every junction at a resolution.
+
+        Args:
+            resolution: Any resolution accepted by resolution_seconds
+
+        Returns:
+            dict: Junction name -> list of counts, one per bucket starting at midnight
+
+        Raises:
+            ValueError: If the resolution is unknown or finer than the stored counts
+        """
+        width = resolution_seconds(resolution)
+        level = self.levels.get(width)
+        if level is None:
+            if width % self.width:
+                raise ValueError(f"Counts were kept per {describe_resolution(self.width).lower()}, "
+                                 f"too coarse for {describe_resolution(width).lower()}")
+            finer = max(stored for stored in self.levels if width % stored == 0)
+            level = self.levels[width] = self._sum_level(self.levels[finer], width // finer)
+        return level
+
+    def junction_pairs(self, resolution="hour", junctions=JUNCTIONS):
+        """
+        Counts of the two histogram junctions side by side.
+
+        Returns:
+            list: One [Elm Avenue count, Hanley Highway count] pair per bucket,
+            the shape bin_hourly_counts gives for whole hours
+        """
+        level = self.counts(resolution)
+        buckets = SECONDS_PER_DAY // resolution_seconds(resolution)
+        columns = [level.get(junction) or [0] * buckets for junction in junctions]
+        return [list(pair) for pair in zip(*columns)]
+
+    def busiest(self, junction, resolution="hour"):
+        """
+        Finds the busiest periods of a junction at a resolution.
+
+        Returns:
+            tuple: (highest count, list of bucket start times in seconds); (0, []) when
+            the junction recorded no vehicles
+        """
+        width = resolution_seconds(resolution)
+        buckets = self.counts(resolution).get(junction)
+        if not buckets or not any(buckets):
+            return 0, []
+        highest = max(buckets)
+        return highest, [index * width for index, count in enumerate(buckets) if count == highest]
+
+    def describe_busiest(self, junction, resolution="hour"):
+        """
+        Formats the busiest periods of a junction, e.g. "Between 17:00 and 18:00".
+
+        Returns:
+            str: The periods joined with "and", or "" when the junction recorded no vehicles
+        """
+        width = resolution_seconds(resolution)
+        return " and ".join(describe_period(start, width) for start in self.busiest(junction, resolution)[1])
+
+    def to_json(self):
+        """
+        Returns the finest level only, as stored in the survey cache; the rest is rebuilt from it.
+        """
+        return {"width": self.width, "counts": self.levels[self.width]}
+
+    @classmethod
+    def from_json(cls, payload):
+        """
+        Rebuilds rollups saved with to_json().
+        """
+        return cls(payload["counts"], payload["width"])
+
+    @classmethod
+    def from_hourly_counts(cls, hourly_data, junctions=JUNCTIONS):
+        """
+        Builds hour and day rollups from {hour: [Elm count, Hanley count]}, e.g. an old cache entry.
+        """
+        return cls({junction: [hourly_data[hour][slot] for hour in range(24)]
+                    for slot, junction in enumerate(junctions)}, RESOLUTIONS["hour"])
+
+    @classmethod
+    def from_rows(cls, rows, width=BASE_WIDTH):
+        """
+        Counts rows of a survey file, e.g. MultiCSVProcessor.current_data, into rollups.
+        """
+        from timeparse import parse_time_of_day
+
+        counts = {}
+        for row in rows:
+            junction = row["JunctionName"]
+            buckets = counts.get(junction)
+            if buckets is None:
+                buckets = counts[junction] = cls.empty_buckets(width)
+            buckets[parse_time_of_day(row["timeOfDay"]) // width] += 1
+        return cls(counts, width)
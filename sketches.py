@@ -0,0 +1,171 @@
+import math
+
+# Percentiles reported for vehicle speeds
+SPEED_PERCENTILES = (0.5, 0.85, 0.95)
+
+
+class QuantileSketch:
+    def __init__(self, k=200):
+        """
+        Mergeable streaming quantile sketch in the style of KLL.
+
+        Values are kept in a stack of compactors. When a level fills up it is
+        sorted and every other item is promoted to the level above with twice
+        the weight, so memory stays at roughly 3k items however many values
+        are added. Sketches built over separate chunks, files or days can be
+        combined with merge() and give the same accuracy as a single pass.
+
+        Args:
+            k (int): Accuracy parameter; rank error is roughly 1.7/k
+        """
+        self.k = k
+        self.compactors = [[]]
+        self.count = 0
+        self.size = 0
+        self.max_size = 0
+        self._flip = 0
+        self._update_max_size()
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _update_max_size(self):
+        self.max_size = sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def update(self, value):
+        """
+        Adds one value to the sketch.
+
+        Args:
+            value (float): The observed value, e.g. a vehicle speed
+        """
+        self.compactors[0].append(value)
+        self.size += 1
+        self.count += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self):
+        for level in range(len(self.compactors)):
+            items = self.compactors[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 >= len(self.compactors):
+                self.compactors.append([])
+                self._update_max_size()
+
+            items.sort()
+            # An odd item out stays behind so no weight is lost
+            held = items.pop() if len(items) % 2 else None
+            # Alternate between even and odd positions so the error does not drift one way
+            self._flip ^= 1
+            promoted = items[self._flip::2]
+            self.compactors[level + 1].extend(promoted)
+            items.clear()
+            if held is not None:
+                items.append(held)
+
+            self.size = sum(len(compactor) for compactor in self.compactors)
+            if self.size < self.max_size:
+                break
+
+    def merge(self, other):
+        """
+        Folds another sketch into this one.
+
+        Args:
+            other (QuantileSketch): The sketch to merge; it is left unchanged
+        """
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        self._update_max_size()
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.count += other.count
+        self.size = sum(len(compactor) for compactor in self.compactors)
+        while self.size >= self.max_size:
+            self._compress()
+
+    def quantile(self, q):
+        """
+        Estimates the value at quantile q.
+
+        Args:
+            q (float): Quantile between 0 and 1, e.g. 0.85
+
+        Returns:
+            float: The estimated value, or None if the sketch is empty
+        """
+        if self.count == 0:
+            return None
+        weighted = sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self.compactors)
+            for value in items
+        )
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
+
+    def to_dict(self):
+        """
+        Returns a JSON-serialisable form, for storing sketches between runs.
+        """
+        return {"k": self.k, "count": self.count, "compactors": self.compactors}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuilds a sketch saved with to_dict.
+
+        Args:
+            data (dict): The stored sketch
+
+        Returns:
+            QuantileSketch: The restored sketch
+        """
+        sketch = cls(data["k"])
+        sketch.compactors = [list(items) for items in data["compactors"]]
+        sketch.count = data["count"]
+        sketch.size = sum(len(items) for items in sketch.compactors)
+        sketch._update_max_size()
+        return sketch
+
+
+def merge_sketch_groups(groups):
+    """
+    Merges several {key: QuantileSketch} mappings key by key.
+
+    Args:
+        groups (list): Mappings from e.g. (junction, hour) to a sketch, one per chunk, file or day
+
+    Returns:
+        dict: A new mapping holding one merged sketch per key
+    """
+    merged = {}
+    for group in groups:
+        for key, sketch in group.items():
+            if key not in merged:
+                merged[key] = QuantileSketch(sketch.k)
+            merged[key].merge(sketch)
+    return merged
+
+
+def speed_percentiles(sketch, percentiles=SPEED_PERCENTILES):
+    """
+    Reads the reported percentiles from one sketch.
+
+    Args:
+        sketch (QuantileSketch): Sketch of vehicle speeds
+        percentiles (tuple): Quantiles to report
+
+    Returns:
+        dict: Maps labels such as "p85" to the estimated speed
+    """
+    return {f"p{round(q * 100)}": sketch.quantile(q) for q in percentiles}
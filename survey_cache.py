@@ -0,0 +1,205 @@
+import json
+import os
+import tempfile
+
+from rollups import TimeRollups
+from sketches import QuantileSketch
+from timeparse import parse_filename_date
+
+# Folder, inside the drop directory, holding one cache entry per survey day
+CACHE_DIR_NAME = ".traffic_cache"
+
+# Hour-of-week baselines built from every ingested day, kept next to the entries
+BASELINE_FILE_NAME = "baselines.json"
+
+
+class SurveyCache:
+    def __init__(self, cache_dir):
+        """
+        Disk cache of processed survey days.
+
+        Each survey file gets one JSON entry holding its outcomes, its hourly
+        vehicle counts per junction and vehicle type, its per-minute counts
+        per junction and its speed sketches, stamped with the
+        size and modification time of the file it was built from. An entry is
+        only returned while the source file still matches that stamp, so an
+        edited or replaced survey is processed again rather than served stale.
+
+        Args:
+            cache_dir (str): Folder the entries are stored in
+        """
+        self.cache_dir = cache_dir
+        self.verified = {}  # Entry path -> (survey stamp, entry stamp, deduplicated) last found current
+
+    @classmethod
+    def for_directory(cls, directory):
+        """
+        Returns the cache that belongs to a drop directory of survey files.
+
+        Args:
+            directory (str): Folder holding the traffic_dataDDMMYYYY.csv files
+        """
+        return cls(os.path.join(directory, CACHE_DIR_NAME))
+
+    def entry_path(self, file_path):
+        """
+        Returns where the entry for a survey file is stored.
+
+        Args:
+            file_path (str): Path of the survey file
+        """
+        return os.path.join(self.cache_dir, os.path.basename(file_path) + ".json")
+
+    def baseline_path(self):
+        """
+        Returns where the hour-of-week baselines for this directory are stored.
+        """
+        return os.path.join(self.cache_dir, BASELINE_FILE_NAME)
+
+    def get(self, file_path, deduplicated=False):
+        """
+        Returns the cached outcomes of a survey file, if they are still current.
+
+        Args:
+            file_path (str): Path of the survey file
+            deduplicated (bool): Whether the caller wants outcomes with duplicate rows removed
+
+        Returns:
+            dict: Outcomes as returned by process_csv_data, including
+            "Hourly Counts", "Type Counts", "Time Rollups" and "Speed Sketches", or None on a miss
+        """
+        try:
+            stamp = _file_stamp(file_path)
+            with open(self.entry_path(file_path), "r") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get("stamp") != stamp or entry["outcomes"].get("Deduplicated", False) != deduplicated:
+            return None
+        return _decode_outcomes(entry["outcomes"])
+
+    def put(self, file_path, outcomes):
+        """
+        Stores the outcomes of a survey file, replacing any older entry.
+
+        Args:
+            file_path (str): Path of the survey file the outcomes were built from
+            outcomes (dict): Outcomes as returned by process_csv_data
+        """
+        entry = {"stamp": _file_stamp(file_path), "outcomes": _encode_outcomes(outcomes)}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Written to a temporary file first so readers never see half an entry
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".entry-")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(entry, file)
+            os.replace(temp_path, self.entry_path(file_path))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def is_current(self, file_path, deduplicated=False):
+        """
+        Tells whether a survey file already has an up-to-date entry.
+
+        An entry is read in full once; after that, while neither the survey
+        nor the entry file changes size or modification time, the answer
+        comes from two stat calls. The watcher asks on every poll.
+
+        Args:
+            file_path (str): Path of the survey file
+            deduplicated (bool): Whether the entry must have duplicate rows removed
+        """
+        entry_path = self.entry_path(file_path)
+        try:
+            stamp = _file_stamp(file_path)
+            key = (tuple(stamp), tuple(_file_stamp(entry_path)), deduplicated)
+            if self.verified.get(entry_path) == key:
+                return True
+            with open(entry_path, "r") as file:
+                entry = json.load(file)
+            current = (entry.get("stamp") == stamp
+                       and entry["outcomes"].get("Deduplicated", False) == deduplicated)
+        except (OSError, ValueError, KeyError):
+            return False
+        if current:
+            self.verified[entry_path] = key
+        return current
+
+
+def ingest_survey(file_path, cache_dir, deduplicate=False):
+    """
+    Processes one survey file and stores its outcomes in the cache.
+
+    Kept at module level so a process pool can run it.
+
+    Args:
+        file_path (str): Path of a traffic_dataDDMMYYYY.csv file
+        cache_dir (str): Folder of the SurveyCache to fill
+        deduplicate (bool): Count rows repeated by overlapping exports only once
+
+    Returns:
+        dict: The outcomes, or None if the name carries no date or the file
+        could not be read; nothing is cached then, so a truncated or malformed
+        survey is never taken for a day with no traffic
+    """
+    # Imported here so the cache can be read without loading the processing code
+    from main import process_csv_data
+
+    survey_date = parse_filename_date(os.path.basename(file_path))
+    if survey_date is None:
+        return None
+    day, month, year = survey_date
+    # Stamp before processing: a file changed mid-read then fails the freshness check later
+    stamp = _file_stamp(file_path)
+    outcomes = process_csv_data(file_path, day, month, year, deduplicate=deduplicate)
+    if outcomes is None:
+        return None  # Removed, truncated or malformed; process_csv_data has reported why
+    cache = SurveyCache(cache_dir)
+    cache.put(file_path, outcomes)
+    if _file_stamp(file_path) != stamp:
+        os.unlink(cache.entry_path(file_path))
+    return outcomes
+
+
+def _file_stamp(file_path):
+    status = os.stat(file_path)
+    return [status.st_size, status.st_mtime_ns]
+
+
+def _encode_outcomes(outcomes):
+    # JSON has no tuple keys or integer keys, so sketches and counts are stored as lists
+    encoded = {key: value for key, value in outcomes.items()
+               if key not in ("Speed Sketches", "Hourly Counts", "Type Counts", "Time Rollups")}
+    encoded["Speed Sketches"] = [
+        [junction, hour, sketch.to_dict()]
+        for (junction, hour), sketch in outcomes.get("Speed Sketches", {}).items()
+    ]
+    if "Hourly Counts" in outcomes:
+        encoded["Hourly Counts"] = [outcomes["Hourly Counts"][hour] for hour in range(24)]
+    if "Type Counts" in outcomes:
+        encoded["Type Counts"] = [list(key) + [count] for key, count in outcomes["Type Counts"].items()]
+    if "Time Rollups" in outcomes:
+        # Only the per-minute counts are stored; the coarser levels are summed again on load
+        encoded["Time Rollups"] = outcomes["Time Rollups"].to_json()
+    return encoded
+
+
+def _decode_outcomes(encoded):
+    outcomes = dict(encoded)
+    outcomes["Speed Sketches"] = {
+        (junction, hour): QuantileSketch.from_dict(sketch)
+        for junction, hour, sketch in encoded.get("Speed Sketches", [])
+    }
+    if "Hourly Counts" in encoded:
+        outcomes["Hourly Counts"] = dict(enumerate(encoded["Hourly Counts"]))
+    if "Type Counts" in encoded:
+        outcomes["Type Counts"] = {
+            (junction, hour, vehicle_type): count for junction, hour, vehicle_type, count in encoded["Type Counts"]
+        }
+    if "Time Rollups" in encoded:
+        outcomes["Time Rollups"] = TimeRollups.from_json(encoded["Time Rollups"])
+    elif "Hourly Counts" in outcomes:
+        # Entries cached before the rollups existed still answer hourly and daily questions
+        outcomes["Time Rollups"] = TimeRollups.from_hourly_counts(outcomes["Hourly Counts"])
+    return outcomes
@@ -0,0 +1,280 @@
+import bz2
+import io
+import os
+import queue
+import threading
+import zlib
+
+# Compressed survey extensions and the codec that reads them, e.g. traffic_data15062024.csv.gz
+COMPRESSED_EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".zst": "zstd",
+}
+
+# Compressed bytes decompressed per call on the decompression thread
+CHUNK_SIZE = 256 * 1024
+
+# Most decompressed bytes one call may return, however well the input compresses
+MAX_OUTPUT_SIZE = 1024 * 1024
+
+# Longest line a compressed survey may hold; a longer one is treated as a decompression bomb
+MAX_LINE_BYTES = 1024 * 1024
+
+# Decompressed chunks the decompression thread may run ahead of the parser
+QUEUE_CHUNKS = 4
+
+
+def compression_of(file_path):
+    """
+    Returns the codec a survey file is compressed with, judged by its extension.
+
+    Args:
+        file_path (str): Path of the survey file
+
+    Returns:
+        str: "gzip", "bz2" or "zstd", or None for a plain CSV file
+    """
+    return COMPRESSED_EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+
+
+def find_survey(file_path):
+    """
+    Finds a survey file or its compressed copy.
+
+    Args:
+        file_path (str): Path of the plain file, e.g. traffic_data15062024.csv
+
+    Returns:
+        str: file_path if it exists, else the first existing .gz, .bz2 or .zst
+        copy of it, else file_path unchanged so the caller reports it missing
+    """
+    if os.path.exists(file_path):
+        return file_path
+    for extension in COMPRESSED_EXTENSIONS:
+        if os.path.exists(file_path + extension):
+            return file_path + extension
+    return file_path
+
+
+def _zstandard(file_path):
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError(f"Reading {os.path.basename(file_path)} needs the zstandard package "
+                         "(pip install zstandard)") from None
+    return zstandard
+
+
+def _new_decompressor(codec):
+    if codec == "gzip":
+        return zlib.decompressobj(zlib.MAX_WBITS | 16)
+    return bz2.BZ2Decompressor()
+
+
+def _zstd_chunks(file_path, chunk_size, max_output):
+    # zstandard's decompressobj cannot bound its output, so its stream reader is read in bounded steps
+    decompressor = _zstandard(file_path).ZstdDecompressor()
+    with open(file_path, "rb") as raw, \
+            decompressor.stream_reader(raw, read_size=chunk_size, read_across_frames=True) as reader:
+        while True:
+            output = reader.read(max_output)
+            if not output:
+                break
+            yield raw.tell(), output
+
+
+def iter_decompressed(file_path, chunk_size=CHUNK_SIZE, max_output=MAX_OUTPUT_SIZE):
+    """
+    Decompresses a compressed survey file one chunk at a time.
+
+    No call returns more than max_output bytes, so a small file that
+    inflates to gigabytes (a decompression bomb) is still read in bounded
+    steps; the caller decides how much of it to keep.
+
+    Args:
+        file_path (str): Path of the compressed file
+        chunk_size (int): Compressed bytes read per step
+        max_output (int): Most decompressed bytes yielded at once
+
+    Yields:
+        tuple: (compressed bytes read so far, decompressed bytes), for each
+        step that produced output
+
+    Raises:
+        EOFError: If the file ends inside its compressed data
+    """
+    codec = compression_of(file_path)
+    if codec == "zstd":
+        yield from _zstd_chunks(file_path, chunk_size, max_output)
+        return
+
+    # Feeds whole compressed chunks to the codec, so each chunk is one long call that releases the GIL
+    decompressor = _new_decompressor(codec)
+    consumed = 0
+    with open(file_path, "rb") as raw:
+        while True:
+            data = raw.read(chunk_size)
+            if not data:
+                break
+            consumed += len(data)
+            while True:
+                if decompressor.eof:
+                    # Concatenated gzip members or bz2 streams continue with a fresh decompressor
+                    decompressor = _new_decompressor(codec)
+                output = decompressor.decompress(data, max_output)
+                if output:
+                    yield consumed, output
+                if decompressor.eof:
+                    data = decompressor.unused_data
+                    if not data:
+                        break
+                    continue
+                # zlib hands back the input it had no room for; bz2 keeps it until called again
+                data = getattr(decompressor, "unconsumed_tail", b"")
+                if not data and len(output) < max_output and getattr(decompressor, "needs_input", True):
+                    break
+    if not decompressor.eof:
+        raise EOFError(f"{os.path.basename(file_path)} ended before the end of its compressed data")
+
+
+def _limit_line_length(file_path, chunks, max_line=MAX_LINE_BYTES):
+    # Passes chunks through until more than max_line bytes go by without a newline. Each chunk is at
+    # most MAX_OUTPUT_SIZE, so only a run crossing chunk boundaries can be longer than one chunk
+    run = 0
+    for chunk in chunks:
+        first = chunk.find(b"\n")
+        if first < 0:
+            run += len(chunk)
+        else:
+            run += first
+        if run > max_line:
+            raise ValueError(f"{os.path.basename(file_path)} has a line longer than {max_line} bytes")
+        if first >= 0:
+            run = len(chunk) - chunk.rfind(b"\n") - 1
+        yield chunk
+
+
+class _ChunkReader(io.RawIOBase):
+    def __init__(self, chunks):
+        """
+        Raw stream over an iterator of byte chunks, read on the calling thread.
+        """
+        super().__init__()
+        self.chunks = chunks
+        self.pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.chunks.close()
+        super().close()
+
+
+class _ThreadedReader(io.RawIOBase):
+    def __init__(self, chunks, max_chunks=QUEUE_CHUNKS):
+        """
+        Raw stream filled by a background decompression thread.
+
+        zlib, bz2 and zstandard release the GIL while they decompress, so the
+        thread inflates the next chunks while the caller parses the current
+        one. The bounded queue keeps at most max_chunks chunks in memory.
+
+        Args:
+            chunks: Iterator of decompressed byte chunks, run on the thread
+            max_chunks (int): Chunks buffered ahead of the reader
+        """
+        super().__init__()
+        self.source = chunks
+        self.chunks = queue.Queue(max_chunks)
+        self.pending = memoryview(b"")
+        self.finished = False
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._produce, name="survey-decompress", daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        # Gives up once the reader is closed, so an abandoned stream never blocks the thread
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            for chunk in self.source:
+                if not self._put(chunk):
+                    break
+        except Exception as e:
+            self.error = e  # Raised in the reading thread, where the parser can report it
+        finally:
+            self.source.close()
+            self._put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.pending:
+            if self.finished:
+                return 0
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.finished = True
+                if self.error is not None:
+                    raise self.error
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+        super().close()
+
+
+def open_survey(file_path, threaded=True):
+    """
+    Opens a survey file for reading as text, decompressing it if needed.
+
+    Plain .csv files are opened as before. .csv.gz, .csv.bz2 and .csv.zst
+    files are decompressed as they are read, never to disk; with threaded
+    set, decompression runs on a separate thread and overlaps parsing.
+    Reading .zst files needs the optional zstandard package. A compressed
+    file with a line longer than MAX_LINE_BYTES raises ValueError when that
+    line is read, before it is held in memory.
+
+    Args:
+        file_path (str): Path of the survey file
+        threaded (bool): Decompress on a background thread
+
+    Returns:
+        A text file object, to be used with csv.DictReader and closed by the caller
+    """
+    codec = compression_of(file_path)
+    if codec is None:
+        return open(file_path, mode='r')
+    chunks = _limit_line_length(file_path, (output for _, output in iter_decompressed(file_path)))
+    reader = _ThreadedReader(chunks) if threaded else _ChunkReader(chunks)
+    return io.TextIOWrapper(io.BufferedReader(reader, buffer_size=1 << 20))
@@ -0,0 +1,31 @@
+import multiprocessing
+
+from baselines import HourOfWeekBaseline, record_day
+
+TYPE_COUNTS = {("Elm Avenue/Rabbit Road", 8, "Car"): 12, ("Hanley Highway/Westway", 17, "Bus"): 3}
+
+
+def record_days(file_path, first_day):
+    for day in range(first_day, first_day + 5):
+        record_day(file_path, {"Type Counts": TYPE_COUNTS}, day, 1, 2024)
+
+
+def test_concurrent_processes_keep_every_day(tmp_path):
+    file_path = str(tmp_path / "baselines.json")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=record_days, args=(file_path, first_day)) for first_day in (1, 6, 11, 16)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    baseline = HourOfWeekBaseline.load(file_path)
+    assert len(baseline.days) == 20
+    assert sum(baseline.weekday_days) == 20
+
+
+def test_outcomes_without_type_counts_are_skipped():
+    baseline = HourOfWeekBaseline()
+    assert baseline.observe_day({"Total Vehicles": 0}, 15, 6, 2024) == []
+    assert baseline.days == set()
+    assert sum(baseline.weekday_days) == 0
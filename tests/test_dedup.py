@@ -0,0 +1,42 @@
+import csv
+import os
+
+from dedup import FINGERPRINT_COLUMNS, BloomFilter, RowDeduplicator
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SURVEY = os.path.join(REPO_ROOT, "traffic_data15062024.csv")
+
+
+def survey_rows():
+    with open(SURVEY, newline="") as file:
+        return list(csv.DictReader(file))
+
+
+def test_spilled_fingerprints_are_still_found(tmp_path):
+    rows = survey_rows()
+    distinct = len({tuple(row[column] for column in FINGERPRINT_COLUMNS) for row in rows})
+    deduplicator = RowDeduplicator(memory_limit=100, spill_dir=str(tmp_path))
+    disk_lookups = []
+    spilled = deduplicator._spilled
+    deduplicator._spilled = lambda fingerprint: disk_lookups.append(fingerprint) or spilled(fingerprint)
+
+    with deduplicator:
+        first_pass = list(deduplicator.unique_rows(rows))
+        assert deduplicator.database is not None and os.path.exists(deduplicator.spill_path)
+        new_row_lookups = len(disk_lookups)
+        second_pass = list(deduplicator.unique_rows(rows))
+
+    assert len(first_pass) == distinct
+    assert second_pass == []
+    assert deduplicator.duplicates == len(rows) + len(rows) - distinct
+    # The Bloom filter keeps almost every new row away from the spill table
+    assert new_row_lookups < len(rows) // 20
+    assert os.listdir(tmp_path) == []
+
+
+def test_bloom_filter_never_misses():
+    bloom = BloomFilter(100)
+    fingerprints = [hash(("row", index)) for index in range(500)]
+    for fingerprint in fingerprints:
+        bloom.add(fingerprint)
+    assert all(fingerprint in bloom for fingerprint in fingerprints)
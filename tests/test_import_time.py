@@ -0,0 +1,73 @@
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fresh interpreters per target; the median is compared with the budget
+RUNS = 3
+# Multiplies every budget, e.g. IMPORT_BUDGET_SCALE=2 on slow CI machines
+BUDGET_SCALE = float(os.environ.get("IMPORT_BUDGET_SCALE", "1"))
+
+# Entry point -> (folder to import from, import budget in ms, modules that must stay lazy)
+TARGETS = {
+    "main": (REPO_ROOT, 60, ["tkinter", "gui", "argparse", "cProfile", "pstats", "tracemalloc"]),
+    "app": (os.path.join(REPO_ROOT, "web"), 250,
+            ["tkinter", "gui", "cProfile", "pstats", "tracemalloc", "preview", "concurrent.futures"]),
+}
+
+
+def measure_import(module, directory):
+    """
+    Imports a module in a fresh interpreter and reads its -X importtime report.
+
+    Args:
+        module (str): Module to import
+        directory (str): Folder the import runs from
+
+    Returns:
+        tuple: (cumulative import time in ms, set of every module imported)
+    """
+    # The web app finds the shared modules at the repository root, as gunicorn.conf.py arranges
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=directory, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    cumulative_us = None
+    imported = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # The column header line
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            cumulative_us = int(cumulative)
+    return cumulative_us / 1000, imported
+
+
+@pytest.mark.parametrize("module", sorted(TARGETS))
+def test_import_stays_within_budget(module):
+    directory, budget_ms, lazy_modules = TARGETS[module]
+    if module == "app":
+        pytest.importorskip("flask")
+    timings = []
+    imported = set()
+    for _ in range(RUNS):
+        elapsed_ms, imported = measure_import(module, directory)
+        timings.append(elapsed_ms)
+
+    budget = budget_ms * BUDGET_SCALE
+    median_ms = statistics.median(timings)
+    assert median_ms <= budget, f"import {module} took {median_ms:.1f} ms, over its {budget:.0f} ms budget"
+    eager = [lazy for lazy in lazy_modules if lazy in imported]
+    assert not eager, f"import {module} loaded {', '.join(eager)}, which should only load on first use"
@@ -0,0 +1,77 @@
+import io
+import os
+import shutil
+
+import pytest
+
+import gui
+import main
+
+SURVEY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "traffic_data15062024.csv")
+
+
+class FakeViewer:
+    # Stands in for the Tk window, which needs a display
+    datasets = []
+
+    def __init__(self, resolution="hour"):
+        pass
+
+    def add_dataset(self, date, traffic_data=None, hourly_data=None, rollups=None):
+        FakeViewer.datasets.append((date, rollups))
+
+    def run(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def survey_dir(tmp_path, monkeypatch):
+    shutil.copy(SURVEY, tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(gui, "HistogramViewer", FakeViewer)
+    FakeViewer.datasets = []
+    return tmp_path
+
+
+def run_main(monkeypatch, capsys, answers):
+    monkeypatch.setattr("sys.stdin", io.StringIO(answers))
+    main.main([])
+    return capsys.readouterr().out
+
+
+def test_processes_a_day_then_answers_it_from_the_cache(survey_dir, monkeypatch, capsys):
+    first = run_main(monkeypatch, capsys, "15\n06\n2024\nn\n")
+    assert "The total number of vehicles recorded for this date is 1037" in first
+    assert "Error" not in first
+    assert FakeViewer.datasets and FakeViewer.datasets[0][0] == "15/06/2024"
+
+    second = run_main(monkeypatch, capsys, "15\n06\n2024\nn\n")
+    assert "Using cached results" in second
+    assert "The total number of vehicles recorded for this date is 1037" in second
+    assert "Error" not in second
+
+    with open(survey_dir / "results.csv") as file:
+        lines = file.read().splitlines()
+    assert len(lines) == 3  # Header and one row per run
+    assert "traffic_data15062024.csv" in (survey_dir / "results.txt").read_text()
+
+
+def test_missing_file_asks_for_another_date(survey_dir, monkeypatch, capsys):
+    output = run_main(monkeypatch, capsys, "16\n06\n2024\n15\n06\n2024\nn\n")
+    assert "Error: File 'traffic_data16062024.csv' not found." in output
+    assert [date for date, _ in FakeViewer.datasets] == ["15/06/2024"]
+
+
+def test_unreadable_survey_is_not_saved_or_cached(survey_dir, monkeypatch, capsys):
+    # A survey without the VehicleType column cannot be counted
+    with open(SURVEY) as source, open(survey_dir / "traffic_data21062024.csv", "w") as target:
+        for line in source:
+            target.write(line.rsplit(",", 2)[0] + "," + line.rsplit(",", 1)[1])
+    output = run_main(monkeypatch, capsys, "21\n06\n2024\n15\n06\n2024\nn\n")
+    assert "No results for traffic_data21062024.csv" in output
+    assert "traffic_data21062024" not in (survey_dir / "results.txt").read_text()
+    assert not (survey_dir / ".traffic_cache" / "traffic_data21062024.csv.json").exists()
+    assert [date for date, _ in FakeViewer.datasets] == ["15/06/2024"]
@@ -0,0 +1,36 @@
+import os
+
+from metrics import WorkerMetrics, clear_metrics_dir
+
+
+def test_changes_are_written_in_batches(tmp_path):
+    metrics = WorkerMetrics(str(tmp_path), save_interval=60)
+    for _ in range(50):
+        metrics.inc("traffic_uploads_total")
+        metrics.observe("traffic_upload_size_bytes", 5000)
+    assert not tmp_path.exists() or os.listdir(tmp_path) == []
+
+    text = metrics.render()  # A scrape writes the worker's own changes first
+    assert "traffic_uploads_total 50" in text
+    assert 'traffic_upload_size_bytes_bucket{le="10000"} 50' in text
+    names = os.listdir(tmp_path)
+    assert len(names) == 1 and names[0].startswith(f"worker_{os.getpid()}_")
+
+
+def test_workers_with_the_same_pid_keep_separate_files(tmp_path):
+    earlier, later = WorkerMetrics(str(tmp_path)), WorkerMetrics(str(tmp_path))
+    earlier.inc("traffic_uploads_total", 2)
+    earlier.flush()
+    later.inc("traffic_uploads_total", 3)
+    later.flush()
+    assert "traffic_uploads_total 5" in later.render()
+
+    clear_metrics_dir(str(tmp_path))
+    assert "traffic_uploads_total 0" in WorkerMetrics(str(tmp_path)).render()
+
+
+def test_histogram_sum_keeps_full_precision(tmp_path):
+    metrics = WorkerMetrics(str(tmp_path))
+    metrics.observe("traffic_upload_size_bytes", 123456789)
+    metrics.observe("traffic_upload_size_bytes", 0.5)
+    assert "traffic_upload_size_bytes_sum 123456789.5\n" in metrics.render()
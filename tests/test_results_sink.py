@@ -0,0 +1,43 @@
+import csv
+import json
+
+from results_sink import RESULT_FIELDS, ResultsSink
+
+
+def outcomes(total):
+    return {field: "" for field in RESULT_FIELDS} | {"Data File": f"day{total}.csv", "Total Vehicles": total}
+
+
+def test_batches_are_appended(tmp_path):
+    for name in ("results.txt", "results.csv", "results.jsonl", "results.json"):
+        file_path = str(tmp_path / name)
+        for total in (10, 20):
+            with ResultsSink(file_path) as sink:
+                sink.write(outcomes(total))
+        with open(file_path, "r") as file:
+            text = file.read()
+        assert "day10.csv" in text and "day20.csv" in text, name
+
+    with open(tmp_path / "results.csv", newline="") as file:
+        assert [row["Total Vehicles"] for row in csv.DictReader(file)] == ["10", "20"]
+    with open(tmp_path / "results.json") as file:
+        assert json.load(file)["data"]["Total Vehicles"] == [10, 20]
+
+
+def test_csv_written_before_new_fields_gains_their_columns(tmp_path):
+    file_path = tmp_path / "results.csv"
+    old_fields = RESULT_FIELDS[:RESULT_FIELDS.index("Rows Quarantined")]
+    file_path.write_text(",".join(old_fields) + "\n" + ",".join(["x"] * len(old_fields)) + "\n")
+
+    with ResultsSink(str(file_path)) as sink:
+        sink.write(outcomes(30) | {"Rows Quarantined": 4, "Duplicates Removed": 2, "Deduplicated": True})
+    with ResultsSink(str(file_path)) as sink:
+        sink.write(outcomes(40))
+
+    with open(file_path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0]) == RESULT_FIELDS
+    assert rows[0]["Rows Quarantined"] == "" and rows[0]["Total Vehicles"] == "x"
+    assert rows[1]["Total Vehicles"] == "30" and rows[1]["Rows Quarantined"] == "4"
+    assert rows[1]["Duplicates Removed"] == "2" and rows[1]["Deduplicated"] == "True"
+    assert rows[2]["Total Vehicles"] == "40"
@@ -0,0 +1,42 @@
+import gzip
+import os
+import shutil
+import sys
+
+import pytest
+
+from main import process_csv_data
+from survey_cache import SurveyCache, ingest_survey
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SURVEY = os.path.join(REPO_ROOT, "traffic_data15062024.csv")
+
+
+def test_truncated_archive_is_not_cached(tmp_path):
+    with open(SURVEY, "rb") as file:
+        compressed = gzip.compress(file.read())
+    file_path = tmp_path / "traffic_data15062024.csv.gz"
+    file_path.write_bytes(compressed[:len(compressed) // 2])
+    cache_dir = tmp_path / "cache"
+
+    assert ingest_survey(str(file_path), str(cache_dir)) is None
+    assert SurveyCache(str(cache_dir)).get(str(file_path)) is None
+
+
+def test_web_day_route_caches_the_programs_outcomes(tmp_path, monkeypatch):
+    pytest.importorskip("flask")
+    sys.path.insert(0, os.path.join(REPO_ROOT, "web"))
+    import app as web_app
+
+    shutil.copy(SURVEY, tmp_path)
+    monkeypatch.setattr(web_app, "DATA_DIR", str(tmp_path))
+    response = web_app.app.test_client().get("/day/15062024")
+    assert response.status_code == 200
+
+    file_path = str(tmp_path / "traffic_data15062024.csv")
+    cached = SurveyCache.for_directory(str(tmp_path)).get(file_path)
+    expected = process_csv_data(file_path, 15, 6, 2024)
+    for key in ("Buses North", "Average Bicycles Per Hour", "Total Vehicles"):
+        assert cached[key] == expected[key]
+    assert cached["Type Counts"] == expected["Type Counts"]
+    assert cached["Hourly Counts"] == expected["Hourly Counts"]
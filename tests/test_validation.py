@@ -0,0 +1,52 @@
+import csv
+import io
+
+from validation import RowValidator
+
+HEADER = ("JunctionName,Date,timeOfDay,travel_Direction_in,travel_Direction_out,Weather_Conditions,"
+          "JunctionSpeedLimit,VehicleSpeed,VehicleType,electricHybrid\n")
+GOOD_ROW = "Elm Avenue/Rabbit Road,15/06/2024,00:40:34,W,W,Overcast,30,34,Bicycle,True\n"
+
+
+def clean(text, quarantine_path=None, batch_size=5000):
+    with RowValidator(quarantine_path, batch_size=batch_size) as validator:
+        rows = list(validator.clean_rows(csv.DictReader(io.StringIO(HEADER + text))))
+    return validator, rows
+
+
+def test_valid_rows_come_back_with_int_speeds():
+    validator, rows = clean(GOOD_ROW * 3)
+    assert len(rows) == 3
+    assert rows[0]["JunctionSpeedLimit"] == 30 and rows[0]["VehicleSpeed"] == 34
+    assert validator.rows_checked == 3 and validator.rows_quarantined == 0
+
+
+def test_bad_rows_are_quarantined_with_line_numbers_and_reasons(tmp_path):
+    quarantine_path = tmp_path / "traffic_data15062024.quarantine.csv"
+    text = (GOOD_ROW
+            + GOOD_ROW.replace("Bicycle", "Hovercraft").replace(",30,", ",999,")
+            + GOOD_ROW
+            + "Elm Avenue/Rabbit Road,15/06/2024,00:40:34\n"
+            + GOOD_ROW.rstrip("\n") + ",extra\n"
+            + GOOD_ROW.replace(",34,", ",3²,"))
+    # A batch size of 2 checks the line numbers carry across batches
+    validator, rows = clean(text, str(quarantine_path), batch_size=2)
+
+    assert len(rows) == 2
+    assert validator.rows_quarantined == 4
+    with open(quarantine_path, newline="") as file:
+        quarantined = [(row["line"], row["reason"]) for row in csv.DictReader(file)]
+    assert quarantined == [
+        ("3", "unknown vehicle type; invalid speed limit"),
+        ("5", "missing fields"),
+        ("6", "too many fields"),
+        ("7", "invalid vehicle speed"),
+    ]
+    assert validator.reasons == {"unknown vehicle type": 1, "invalid speed limit": 1, "missing fields": 1,
+                                 "too many fields": 1, "invalid vehicle speed": 1}
+
+
+def test_superscript_digits_do_not_fail_the_whole_file():
+    validator, rows = clean(GOOD_ROW + GOOD_ROW.replace(",30,", ",²,"))
+    assert len(rows) == 1
+    assert validator.reasons == {"invalid speed limit": 1}
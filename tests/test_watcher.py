@@ -0,0 +1,46 @@
+import gzip
+import os
+import shutil
+import time
+
+import survey_cache
+from survey_cache import SurveyCache, ingest_survey
+from watcher import SurveyWatcher
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SURVEY = os.path.join(REPO_ROOT, "traffic_data15062024.csv")
+
+
+def test_failed_file_is_retried_only_after_it_changes(tmp_path, capsys):
+    with open(SURVEY, "rb") as file:
+        compressed = gzip.compress(file.read())
+    file_path = tmp_path / "traffic_data15062024.csv.gz"
+    file_path.write_bytes(compressed[:len(compressed) // 2])
+
+    watcher = SurveyWatcher(str(tmp_path), max_workers=1, poll_interval=0.05, use_inotify=False)
+    watcher.start()
+    try:
+        time.sleep(1.0)
+        assert capsys.readouterr().out.count("Could not ingest") == 1
+
+        file_path.write_bytes(compressed)
+        deadline = time.monotonic() + 10
+        while not watcher.cache.is_current(str(file_path)) and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        watcher.stop()
+    assert "Ingested traffic_data15062024.csv.gz" in capsys.readouterr().out
+
+
+def test_current_entry_is_not_read_again(tmp_path, monkeypatch):
+    shutil.copy(SURVEY, tmp_path)
+    file_path = str(tmp_path / "traffic_data15062024.csv")
+    cache = SurveyCache.for_directory(str(tmp_path))
+    assert ingest_survey(file_path, cache.cache_dir) is not None
+    assert cache.is_current(file_path)
+
+    def no_parsing(file):
+        raise AssertionError("the entry was parsed again")
+
+    monkeypatch.setattr(survey_cache.json, "load", no_parsing)
+    assert cache.is_current(file_path)
@@ -0,0 +1,126 @@
+import gzip
+import io
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SURVEY = os.path.join(REPO_ROOT, "traffic_data15062024.csv")
+
+
+@pytest.fixture
+def web_app(tmp_path, monkeypatch):
+    pytest.importorskip("flask")
+    sys.path.insert(0, os.path.join(REPO_ROOT, "web"))
+    import app as web_app
+
+    upload_dir = tmp_path / "uploads"
+    monkeypatch.setattr(web_app, "UPLOAD_FOLDER", str(upload_dir))
+    return web_app
+
+
+def survey_bytes():
+    with open(SURVEY, "rb") as file:
+        return file.read()
+
+
+def test_preview_keeps_uploads_inside_the_folder(web_app, tmp_path):
+    data = {"file": (io.BytesIO(survey_bytes()), "../escaped_traffic_data15062024.csv")}
+    response = web_app.app.test_client().post("/preview", data=data, content_type="multipart/form-data")
+
+    assert response.status_code == 200
+    assert response.get_json()["Total Vehicles"] == {"value": 1037, "margin": 0}
+    assert not (tmp_path / "escaped_traffic_data15062024.csv").exists()
+    assert os.listdir(tmp_path / "uploads") == []
+
+
+def test_compressed_preview_stops_at_the_row_cap(tmp_path):
+    from preview import estimate_outcomes
+
+    header, *rows = survey_bytes().splitlines(keepends=True)
+    file_path = tmp_path / "traffic_data15062024.csv.gz"
+    file_path.write_bytes(gzip.compress(header + b"".join(rows) * 20))
+
+    estimates = estimate_outcomes(str(file_path), block_rows=50, max_blocks=4)
+    assert estimates["Exact"] is False
+    assert estimates["Sampled Rows"] == 200
+    assert abs(estimates["Total Vehicles"]["value"] - 1037 * 20) < 1037 * 20 * 0.1
+
+
+def test_same_named_uploads_do_not_overwrite_each_other(web_app, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(web_app, "worker_pool", ThreadPoolExecutor(max_workers=2))
+    full = survey_bytes()
+    short = b"".join(full.splitlines(keepends=True)[:102])
+    data = {"file": [(io.BytesIO(full), "traffic_data15062024.csv"),
+                     (io.BytesIO(short), "traffic_data15062024.csv")]}
+    response = web_app.app.test_client().post("/submit", data=data, content_type="multipart/form-data")
+
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert '<td class="result-value">1037</td>' in page
+    assert '<td class="result-value">101</td>' in page
+    assert '<td class="result-value">1138</td>' in page
+    assert page.count("<th>traffic_data15062024.csv</th>") == 2
+
+
+def test_preview_of_a_decompression_bomb_stays_bounded(tmp_path):
+    from preview import estimate_outcomes
+    from survey_io import MAX_OUTPUT_SIZE, iter_decompressed
+
+    file_path = tmp_path / "traffic_data15062024.csv.gz"
+    file_path.write_bytes(gzip.compress(b"x" * (64 * MAX_OUTPUT_SIZE)))
+    assert max(len(output) for _, output in iter_decompressed(str(file_path))) == MAX_OUTPUT_SIZE
+    with pytest.raises(ValueError):
+        estimate_outcomes(str(file_path))
+
+
+@pytest.mark.parametrize("route", ["/preview", "/submit"])
+def test_routes_reject_a_bomb_without_holding_its_line(web_app, route):
+    import tracemalloc
+
+    from survey_io import MAX_LINE_BYTES
+
+    header = survey_bytes().splitlines(keepends=True)[0]
+    bomb = gzip.compress(header + b"x" * (64 * MAX_LINE_BYTES))
+    data = {"file": (io.BytesIO(bomb), "traffic_data15062024.csv.gz")}
+
+    tracemalloc.start()
+    try:
+        response = web_app.app.test_client().post(route, data=data, content_type="multipart/form-data")
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert response.status_code == 400
+    assert peak < 16 * MAX_LINE_BYTES
+
+
+def test_submitted_uploads_and_quarantine_files_are_deleted(web_app):
+    client = web_app.app.test_client()
+    header, *rows = survey_bytes().splitlines(keepends=True)
+    with_bad_row = header + b"".join(rows[:50]) + b"not,a,valid,row\n"
+    unreadable = b"Nothing,Useful\n1,2\n"
+    for body, status in ((with_bad_row, 200), (unreadable, 400)):
+        data = {"file": (io.BytesIO(body), "traffic_data15062024.csv")}
+        response = client.post("/submit", data=data, content_type="multipart/form-data")
+        assert response.status_code == status
+        assert os.listdir(web_app.UPLOAD_FOLDER) == []
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_preview_of_the_start_of_a_file_is_a_head_sample(web_app, compress):
+    header, *rows = survey_bytes().splitlines(keepends=True)
+    whole = header + b"".join(rows) * 20
+    name = "traffic_data15062024.csv"
+    if compress:
+        whole, name = gzip.compress(whole), name + ".gz"
+    data = {"file": (io.BytesIO(whole[:len(whole) // 8]), name), "size": str(len(whole))}
+    response = web_app.app.test_client().post("/preview", data=data, content_type="multipart/form-data")
+
+    assert response.status_code == 200
+    estimates = response.get_json()
+    assert estimates["Sample"] == "head" and estimates["Exact"] is False
+    assert estimates["Total Vehicles"]["margin"] is None
+    assert abs(estimates["Total Vehicles"]["value"] - 1037 * 20) < 1037 * 20 * 0.15
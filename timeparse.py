@@ -0,0 +1,128 @@
+import datetime
+import re
+
+# Seconds since midnight for every valid HH:MM:SS string seen so far. There are
+# only 86,400 valid times, so the table stays bounded and repeat lookups
+# return the cached int without slicing or converting anything.
+_TIME_TABLE = {}
+
+# Hour of the day for the same strings, filled alongside _TIME_TABLE
+_HOUR_TABLE = {}
+
+# Day ordinals for DD/MM/YYYY strings; a survey file holds one or two distinct dates
+_DATE_TABLE = {}
+_DATE_TABLE_LIMIT = 4096
+
+# Integer value of every two-digit field, so no int() call is needed per field
+_TWO_DIGITS = {f"{value:02d}": value for value in range(100)}
+
+# Date embedded in survey file names such as traffic_data15062024.csv
+_FILENAME_DATE = re.compile(r'(\d{2})(\d{2})(\d{4})')
+
+
+def parse_time_of_day(text):
+    """
+    Converts a timeOfDay value in HH:MM:SS format to seconds since midnight.
+
+    Args:
+        text (str): The timeOfDay value, e.g. "18:40:34"
+
+    Returns:
+        int: Seconds since midnight (0-86399)
+
+    Raises:
+        ValueError: If the value is not a valid HH:MM:SS time
+    """
+    seconds = _TIME_TABLE.get(text)
+    if seconds is not None:
+        return seconds
+
+    # Fixed byte offsets: HH at 0, MM at 3, SS at 6
+    if len(text) != 8 or text[2] != ":" or text[5] != ":":
+        raise ValueError(f"Malformed timeOfDay value: {text!r}")
+    hours = _TWO_DIGITS.get(text[0:2])
+    minutes = _TWO_DIGITS.get(text[3:5])
+    secs = _TWO_DIGITS.get(text[6:8])
+    if hours is None or minutes is None or secs is None or hours > 23 or minutes > 59 or secs > 59:
+        raise ValueError(f"Malformed timeOfDay value: {text!r}")
+
+    seconds = hours * 3600 + minutes * 60 + secs
+    _TIME_TABLE[text] = seconds
+    _HOUR_TABLE[text] = hours
+    return seconds
+
+
+def hour_of(text):
+    """
+    Returns the hour (0-23) of a timeOfDay value in HH:MM:SS format.
+
+    Args:
+        text (str): The timeOfDay value, e.g. "18:40:34"
+
+    Returns:
+        int: The hour of the day
+
+    Raises:
+        ValueError: If the value is not a valid HH:MM:SS time
+    """
+    hour = _HOUR_TABLE.get(text)
+    if hour is not None:
+        return hour
+    return parse_time_of_day(text) // 3600
+
+
+def parse_date(text):
+    """
+    Converts a Date value in DD/MM/YYYY format to a day ordinal.
+
+    Args:
+        text (str): The Date value, e.g. "15/06/2024"
+
+    Returns:
+        int: The proleptic Gregorian ordinal of the date (see date.toordinal)
+
+    Raises:
+        ValueError: If the value is not a valid DD/MM/YYYY date
+    """
+    ordinal = _DATE_TABLE.get(text)
+    if ordinal is not None:
+        return ordinal
+
+    if len(text) != 10 or text[2] != "/" or text[5] != "/":
+        raise ValueError(f"Malformed Date value: {text!r}")
+    day = _TWO_DIGITS.get(text[0:2])
+    month = _TWO_DIGITS.get(text[3:5])
+    century = _TWO_DIGITS.get(text[6:8])
+    year_in_century = _TWO_DIGITS.get(text[8:10])
+    if day is None or month is None or century is None or year_in_century is None:
+        raise ValueError(f"Malformed Date value: {text!r}")
+    try:
+        ordinal = datetime.date(century * 100 + year_in_century, month, day).toordinal()
+    except ValueError:
+        raise ValueError(f"Malformed Date value: {text!r}") from None
+
+    if len(_DATE_TABLE) >= _DATE_TABLE_LIMIT:
+        _DATE_TABLE.clear()
+    _DATE_TABLE[text] = ordinal
+    return ordinal
+
+
+def parse_filename_date(file_name):
+    """
+    Extracts the survey date from a file name such as traffic_data15062024.csv.
+
+    Args:
+        file_name (str): The survey file name
+
+    Returns:
+        tuple: (day, month, year), or None if the name holds no valid date
+    """
+    match = _FILENAME_DATE.search(file_name)
+    if not match:
+        return None
+    day, month, year = int(match.group(1)), int(match.group(2)), int(match.group(3))
+    try:
+        datetime.date(year, month, day)
+    except ValueError:
+        return None
+    return day, month, year
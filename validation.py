@@ -0,0 +1,198 @@
+import csv
+import os
+from itertools import chain, islice
+from operator import itemgetter
+
+from timeparse import hour_of, parse_date
+
+# Columns every survey file must provide
+REQUIRED_COLUMNS = [
+    "JunctionName", "Date", "timeOfDay", "travel_Direction_in", "travel_Direction_out",
+    "Weather_Conditions", "JunctionSpeedLimit", "VehicleSpeed", "VehicleType", "electricHybrid",
+]
+
+# Accepted values for the enumerated columns
+KNOWN_JUNCTIONS = {"Elm Avenue/Rabbit Road", "Hanley Highway/Westway"}
+KNOWN_VEHICLE_TYPES = {"Car", "Bicycle", "Van", "Motorcycle", "Truck", "Buss", "Bus", "Scooter", "Taxi"}
+KNOWN_DIRECTIONS = {"N", "NE", "E", "SE", "S", "SW", "W", "NW"}
+KNOWN_WEATHER = {"Clear", "Bright", "Overcast", "Fog", "Light Rain", "Heavy Rain", "Light Snow", "Heavy Snow"}
+BOOLEAN_VALUES = {"True", "False"}
+
+# Plausible ranges for the numeric columns, in mph
+SPEED_LIMIT_RANGE = (5, 120)
+VEHICLE_SPEED_RANGE = (0, 250)
+
+
+def _integer_in_range(value, low, high):
+    # isdigit rejects blanks and signs, and isascii rejects digits such as "²" that int() cannot parse
+    return value is not None and value.isascii() and value.isdigit() and low <= int(value) <= high
+
+
+def _valid_time(value):
+    try:
+        hour_of(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _valid_date(value):
+    try:
+        parse_date(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+# Column checks run over a whole batch at a time: (column, predicate, reason)
+COLUMN_CHECKS = [
+    ("JunctionName", lambda value: value in KNOWN_JUNCTIONS, "unknown junction"),
+    ("VehicleType", lambda value: value in KNOWN_VEHICLE_TYPES, "unknown vehicle type"),
+    ("travel_Direction_in", lambda value: value in KNOWN_DIRECTIONS, "unknown direction in"),
+    ("travel_Direction_out", lambda value: value in KNOWN_DIRECTIONS, "unknown direction out"),
+    ("Weather_Conditions", lambda value: value in KNOWN_WEATHER, "unknown weather"),
+    ("electricHybrid", lambda value: value in BOOLEAN_VALUES, "electricHybrid is not True/False"),
+    ("JunctionSpeedLimit", lambda value: _integer_in_range(value, *SPEED_LIMIT_RANGE), "invalid speed limit"),
+    ("VehicleSpeed", lambda value: _integer_in_range(value, *VEHICLE_SPEED_RANGE), "invalid vehicle speed"),
+    ("timeOfDay", _valid_time, "malformed timeOfDay"),
+    ("Date", _valid_date, "malformed Date"),
+]
+
+
+class RowValidator:
+    def __init__(self, quarantine_path=None, batch_size=5000):
+        """
+        Checks survey rows in batches and diverts bad rows to a quarantine file.
+
+        Valid rows come back with JunctionSpeedLimit and VehicleSpeed already
+        converted to int. Rows that fail any check are written, with the line
+        number and every reason, to the quarantine file instead of stopping
+        the run.
+
+        Args:
+            quarantine_path (str): CSV file for rejected rows; rejected rows are
+                only counted when this is None
+            batch_size (int): Number of rows checked together
+        """
+        self.quarantine_path = quarantine_path
+        self.batch_size = batch_size
+        self.rows_checked = 0
+        self.rows_quarantined = 0
+        self.reasons = {}
+        self._quarantine_file = None
+        self._quarantine_writer = None
+
+    def clean_rows(self, reader):
+        """
+        Returns an iterator over the valid rows of a csv.DictReader.
+
+        Args:
+            reader (csv.DictReader): Reader over a survey file
+
+        Returns:
+            iterator: Each valid row, with the speed columns converted to int
+
+        Raises:
+            ValueError: If the file header lacks a required column
+        """
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
+        # Batches are flattened by chain so the per-row step stays in C
+        return chain.from_iterable(self._clean_batches(reader))
+
+    def _clean_batches(self, reader):
+        while True:
+            first_line = reader.line_num + 1
+            batch = list(islice(reader, self.batch_size))
+            if not batch:
+                return
+            yield self.validate_batch(batch, first_line)
+
+    def validate_batch(self, rows, first_line=None):
+        """
+        Checks one batch of rows column by column.
+
+        Args:
+            rows (list): Row dictionaries from csv.DictReader
+            first_line (int): File line number of the first row, for the quarantine file
+
+        Returns:
+            list: The valid rows, with the speed columns converted to int
+        """
+        problems = {}
+        for column, is_valid, reason in COLUMN_CHECKS:
+            get_value = itemgetter(column)
+            # Each distinct value is checked once per batch, not once per row
+            bad_values = {value for value in set(map(get_value, rows)) if not is_valid(value)}
+            if bad_values:
+                for index, value in enumerate(map(get_value, rows)):
+                    if value in bad_values:
+                        # A short line leaves its trailing fields as None
+                        row_reason = "missing fields" if value is None else reason
+                        reasons = problems.setdefault(index, [])
+                        if row_reason not in reasons:
+                            reasons.append(row_reason)
+
+        # An overlong line collects its extra fields under the None key
+        for index in [index for index, row in enumerate(rows) if None in row]:
+            problems.setdefault(index, []).append("too many fields")
+
+        self.rows_checked += len(rows)
+        if not problems:
+            valid = rows
+        else:
+            valid = [row for index, row in enumerate(rows) if index not in problems]
+            self._quarantine(rows, problems, first_line)
+
+        for row in valid:
+            row["JunctionSpeedLimit"] = int(row["JunctionSpeedLimit"])
+            row["VehicleSpeed"] = int(row["VehicleSpeed"])
+        return valid
+
+    def _quarantine(self, rows, problems, first_line):
+        for index, reasons in sorted(problems.items()):
+            self.rows_quarantined += 1
+            for reason in reasons:
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+            if self.quarantine_path is None:
+                continue
+            if self._quarantine_writer is None:
+                self._quarantine_file = open(self.quarantine_path, "w", newline="")
+                self._quarantine_writer = csv.writer(self._quarantine_file)
+                self._quarantine_writer.writerow(["line", "reason"] + REQUIRED_COLUMNS)
+            row = rows[index]
+            line = first_line + index if first_line is not None else ""
+            self._quarantine_writer.writerow(
+                [line, "; ".join(reasons)] + [row.get(column) or "" for column in REQUIRED_COLUMNS])
+
+    def close(self):
+        """
+        Closes the quarantine file if any rows were written to it.
+        """
+        if self._quarantine_file is not None:
+            self._quarantine_file.close()
+            self._quarantine_file = None
+            self._quarantine_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def quarantine_path_for(file_path):
+    """
+    Returns the quarantine file used for a survey file, e.g. traffic_data15062024.quarantine.csv.
+
+    Args:
+        file_path (str): Path of the survey file
+
+    Returns:
+        str: Path of the matching quarantine file
+    """
+    base, extension = os.path.splitext(file_path)
+    if extension.lower() in (".gz", ".bz2", ".zst"):
+        base, _ = os.path.splitext(base)  # traffic_data15062024.csv.gz -> traffic_data15062024
+    return f"{base}.quarantine.csv"
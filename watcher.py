@@ -0,0 +1,257 @@
+import os
+import re
+import struct
+import sys
+import threading
+
+from baselines import describe_anomaly, record_day
+from survey_cache import SurveyCache, ingest_survey
+from timeparse import parse_filename_date
+
+# Daily survey files dropped by the counters, e.g. traffic_data15062024.csv or an archived .csv.gz
+SURVEY_FILE = re.compile(r"^traffic_data\d{8}\.csv(\.gz|\.bz2|\.zst)?$")
+
+# inotify event flags: a file finished being written, or was moved into the folder
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _open_inotify(directory):
+    # Returns an inotify descriptor watching directory, or None where inotify is unavailable
+    if not sys.platform.startswith("linux"):
+        return None
+    import ctypes
+    import ctypes.util
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class SurveyWatcher:
+    def __init__(self, directory, max_workers=2, poll_interval=2.0, use_inotify=True, deduplicate=False):
+        """
+        Watches a drop directory and ingests survey files as they arrive.
+
+        New or changed traffic_dataDDMMYYYY.csv files are processed in the
+        background and stored in the directory's SurveyCache, so the program
+        and the web app can answer a query for that date without reading the
+        CSV again. On Linux the watcher sleeps on inotify and wakes when a file
+        is closed after writing or moved in; elsewhere it polls the folder and
+        waits until a file's size and modification time stop changing. Each
+        ingested day is also flagged against, and folded into, the
+        hour-of-week baselines.
+
+        Args:
+            directory (str): Folder the survey files are dropped into
+            max_workers (int): Upper bound on files ingested at the same time
+            poll_interval (float): Seconds between scans when polling
+            use_inotify (bool): False forces the polling fallback
+            deduplicate (bool): Count rows repeated by overlapping exports only once
+        """
+        self.directory = directory
+        self.cache = SurveyCache.for_directory(directory)
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.deduplicate = deduplicate
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.baseline_lock = threading.Lock()  # Also serialises ingest threads where record_day has no flock
+        self.in_flight = {}  # File path -> future of its running ingest
+        self.requeue = set()  # Files that changed again while being ingested
+        self.failed = {}  # File path -> (size, mtime) of a version that could not be ingested
+        self.pool = None
+        self.thread = None
+
+    def survey_files(self):
+        """
+        Lists the survey files currently in the drop directory.
+
+        Returns:
+            list: Full paths of every traffic_dataDDMMYYYY.csv file
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in sorted(names) if SURVEY_FILE.match(name)]
+
+    def submit(self, file_path):
+        """
+        Queues a survey file for ingestion unless its cache entry is current.
+
+        A version of the file that failed to ingest, e.g. a truncated archive,
+        is not tried again until its size or modification time changes.
+
+        Args:
+            file_path (str): Path of the survey file
+        """
+        try:
+            status = os.stat(file_path)
+        except FileNotFoundError:
+            return
+        stamp = (status.st_size, status.st_mtime_ns)
+        if self.failed.get(file_path) == stamp:
+            return
+        if self.cache.is_current(file_path, deduplicated=self.deduplicate):
+            return
+        with self.lock:
+            if file_path in self.in_flight:
+                # Ingest again once the running one finishes, as it may have read old content
+                self.requeue.add(file_path)
+                return
+            future = self.pool.submit(ingest_survey, file_path, self.cache.cache_dir, self.deduplicate)
+            self.in_flight[file_path] = future
+        future.add_done_callback(lambda done: self._finished(file_path, stamp, done))
+
+    def _finished(self, file_path, stamp, future):
+        with self.lock:
+            self.in_flight.pop(file_path, None)
+            again = file_path in self.requeue
+            self.requeue.discard(file_path)
+        error = future.exception()
+        if error is not None or not future.result():
+            self.failed[file_path] = stamp
+            if error is not None:
+                print(f"Error ingesting {os.path.basename(file_path)}: {error}")
+            else:
+                print(f"Could not ingest {os.path.basename(file_path)}; it is retried once it changes")
+        else:
+            self.failed.pop(file_path, None)
+            print(f"Ingested {os.path.basename(file_path)}")
+            self._record_baseline(file_path)
+        if again and not self.stop_event.is_set() and os.path.exists(file_path):
+            self.submit(file_path)
+
+    def _record_baseline(self, file_path):
+        outcomes = self.cache.get(file_path, deduplicated=self.deduplicate)
+        if outcomes is None:
+            return  # Changed again since; the next ingest records it
+        try:
+            with self.baseline_lock:
+                anomalies = record_day(self.cache.baseline_path(), outcomes,
+                                       *parse_filename_date(os.path.basename(file_path)))
+        except (OSError, ValueError) as e:
+            print(f"Could not update the hour-of-week baselines: {e}")
+            return
+        for anomaly in anomalies:
+            print(f"  {os.path.basename(file_path)}: {describe_anomaly(anomaly)}")
+
+    def run(self):
+        """
+        Ingests the files already present, then watches until stop() is called.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        try:
+            for file_path in self.survey_files():
+                self.submit(file_path)
+
+            fd = _open_inotify(self.directory) if self.use_inotify else None
+            if fd is not None:
+                self._watch_inotify(fd)
+            else:
+                self._watch_polling()
+        finally:
+            self.pool.shutdown(wait=True)
+
+    def _watch_inotify(self, fd):
+        import select
+
+        try:
+            while not self.stop_event.is_set():
+                # The timeout lets stop() take effect without an event arriving
+                ready, _, _ = select.select([fd], [], [], 1.0)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                offset = 0
+                while offset < len(data):
+                    _, _, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+                    offset += _EVENT_HEADER.size
+                    name = data[offset:offset + name_length].rstrip(b"\0").decode(errors="replace")
+                    offset += name_length
+                    if SURVEY_FILE.match(name):
+                        self.submit(os.path.join(self.directory, name))
+        finally:
+            os.close(fd)
+
+    def _watch_polling(self):
+        # File path -> (size, mtime) from the previous scan; a file is ingested once it holds still
+        previous = {}
+        while not self.stop_event.wait(self.poll_interval):
+            current = {}
+            for file_path in self.survey_files():
+                try:
+                    status = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                current[file_path] = (status.st_size, status.st_mtime_ns)
+                if previous.get(file_path) == current[file_path]:
+                    self.submit(file_path)
+            previous = current
+
+    def start(self):
+        """
+        Runs the watcher on a background thread.
+
+        Returns:
+            threading.Thread: The thread running the watcher
+        """
+        self.thread = threading.Thread(target=self.run, name="survey-watcher", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        """
+        Stops watching and waits for ingests already running to finish.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest survey files as they are dropped into a folder.")
+    parser.add_argument("directory", nargs="?", default=".", help="drop directory to watch (default: .)")
+    parser.add_argument("--workers", type=int, default=2, help="files ingested at the same time (default: 2)")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="seconds between scans when inotify is unavailable (default: 2)")
+    parser.add_argument("--poll", action="store_true", help="poll even where inotify is available")
+    parser.add_argument("--dedup", action="store_true", help="count rows repeated by overlapping exports only once")
+    args = parser.parse_args(argv)
+
+    watcher = SurveyWatcher(args.directory, max_workers=args.workers,
+                            poll_interval=args.poll_interval, use_inotify=not args.poll,
+                            deduplicate=args.dedup)
+    print(f"Watching {os.path.abspath(args.directory)} for survey files (Ctrl+C to stop)")
+    watcher.start()
+    try:
+        while watcher.thread.is_alive():
+            watcher.thread.join(1.0)
+    except KeyboardInterrupt:
+        print("Stopping watcher...")
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
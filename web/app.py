@@ -1,29 +1,51 @@
+import hashlib
 import os
-import re
-from flask import Flask, render_template, request, send_from_directory
+import tempfile
+import time
+from collections import OrderedDict
+from itertools import islice
+from flask import Flask, jsonify, render_template, request, send_from_directory
 import csv
 
+# Shared ingest helpers (instrumentation, parsing, metrics) live next to main.py at the repository
+# root, which must be on the import path: gunicorn.conf.py adds it, and vercel.json deploys from it
+from instrumentation import timings
+from metrics import metrics
+from rollups import TimeRollups, resolution_seconds
+from survey_io import find_survey, open_survey
+from timeparse import parse_date, parse_filename_date, parse_time_of_day
+from validation import RowValidator, quarantine_path_for
+
 # Initialize the Flask application
 app = Flask(__name__)
 
-UPLOAD_FOLDER = '/tmp/uploads'
+# TRAFFIC_PROFILE=1 turns on stage timers; "cprofile" or "tracemalloc" also captures a profile
+PROFILE_SETTING = os.environ.get("TRAFFIC_PROFILE", "").strip().lower()
+if PROFILE_SETTING and PROFILE_SETTING not in ("0", "false", "no"):
+    timings.enable(PROFILE_SETTING if PROFILE_SETTING in ("cprofile", "tracemalloc") else None)
+
+# Uploaded surveys are saved here before processing; TRAFFIC_UPLOAD_DIR moves them elsewhere
+UPLOAD_FOLDER = os.environ.get("TRAFFIC_UPLOAD_DIR", '/tmp/uploads')
+
+# Drop directory watched by watcher.py; /day/<DDMMYYYY> answers from its survey cache
+DATA_DIR = os.environ.get("TRAFFIC_DATA_DIR")
 
-# Ensure the upload folder exists
+# Outcomes of recent uploads keyed by (content hash, file name), newest last
+OUTCOME_CACHE_SIZE = 32
+outcome_cache = OrderedDict()
+
+# Ensure the upload folder exists; called on first use rather than at import, to keep cold starts short
 def ensure_upload_folder_exists():
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)
+    if not os.path.isdir(UPLOAD_FOLDER):
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
         print(f"Created new folder: {UPLOAD_FOLDER}")
-    else:
-        print(f"Using existing folder: {UPLOAD_FOLDER}")
-
-ensure_upload_folder_exists()
 
 # In the submit route, add a function to check the CSV structure
 def validate_csv(file):
     try:
-        with open(file, mode='r') as f:
+        with open_survey(file) as f:
             reader = csv.DictReader(f)
-            return list(reader)[:5]  # return the first 5 rows for preview
+            return list(islice(reader, 5))  # read only the first 5 rows for preview
     except Exception as e:
         return None
 
@@ -46,6 +68,7 @@ def process_csv_data(file_name, day, month, year):
         "Highest Hourly Count": 0,
         "Most Vehicles Hour": "",
         "Rain Hours": 0,
+        "Rows Quarantined": 0,
         "Date": f"{day:02d}{month:02d}{year}",
         "Data File": os.path.basename(file_name)
     }
@@ -65,18 +88,22 @@ def process_csv_data(file_name, day, month, year):
     hanley_highway_vehicles = 0
     scooters = 0
     rainy_hours = set()
-    hanley_hourly_counts = {}
+    minute_counts = {}  # Vehicles per minute of the day at each junction
     total_bicycle_count = 0
 
     try:
-        with open(file_name, mode='r') as file:
+        parse_started = time.perf_counter()
+        # Malformed rows are set aside in the quarantine file instead of failing the upload
+        validator = RowValidator(quarantine_path_for(file_name))
+        with open_survey(file_name) as file, validator, timings.stage("parse"):
             reader = csv.DictReader(file)
 
-            for row in reader:
+            for row in validator.clean_rows(reader):
                 vehicle_type = row["VehicleType"]
-                time_of_day = row["timeOfDay"]
-                speed_limit = int(row["JunctionSpeedLimit"])
-                vehicle_speed = int(row["VehicleSpeed"])
+                seconds = parse_time_of_day(row["timeOfDay"])
+                hour = seconds // 3600
+                speed_limit = row["JunctionSpeedLimit"]
+                vehicle_speed = row["VehicleSpeed"]
                 is_electric = row["electricHybrid"] == "True"
                 junction_name = row["JunctionName"]
                 weather_conditions = row["Weather_Conditions"]
@@ -109,21 +136,24 @@ def process_csv_data(file_name, day, month, year):
                 if vehicle_type == "Scooter" and junction_name == "Elm Avenue/Rabbit Road":
                     scooters += 1
 
-                if junction_name == "Hanley Highway/Westway":
-                    hour = time_of_day.split(":")[0]
-                    if hour not in hanley_hourly_counts:
-                        hanley_hourly_counts[hour] = 0
-                    hanley_hourly_counts[hour] += 1
+                minutes = minute_counts.get(junction_name)
+                if minutes is None:
+                    minutes = minute_counts[junction_name] = TimeRollups.empty_buckets()
+                minutes[seconds // 60] += 1
 
                 if vehicle_type == "Bicycle":
-                    hour = time_of_day.split(":")[0]
                     total_bicycle_count += 1
 
                 if weather_conditions in ["Light Rain", "Heavy Rain"]:
-                    hour = time_of_day.split(":")[0]
-                    rainy_hours.add((row["Date"], hour))
+                    rainy_hours.add((parse_date(row["Date"]), hour))
 
         total_rainy_hours = len(rainy_hours)
+        outcome_started = time.perf_counter()
+        metrics.observe("traffic_parse_duration_seconds", outcome_started - parse_started)
+        metrics.observe("traffic_rows_processed", total_vehicles)
+        if timings.enabled:
+            timings.count("rows", total_vehicles)
+            timings.count("bytes", os.path.getsize(file_name))
 
         outcomes.update({
             "Total Vehicles": total_vehicles,
@@ -137,6 +167,7 @@ def process_csv_data(file_name, day, month, year):
             "Hanley Highway Westway": hanley_highway_vehicles,
             "Truck Percentage": round((total_trucks / total_vehicles) * 100) if total_vehicles else 0,
             "Rain Hours": total_rainy_hours,
+            "Rows Quarantined": validator.rows_quarantined,
         })
 
         unique_hours_in_day = len(set(range(0, 24)))  # 24 hours in a day
@@ -149,11 +180,14 @@ def process_csv_data(file_name, day, month, year):
         else:
             outcomes["Scooter Percentage"] = 0
 
-        if hanley_hourly_counts:
-            highest_hourly_count = max(hanley_hourly_counts.values())
-            outcomes["Highest Hourly Count"] = highest_hourly_count
-            most_vehicles_hours = [hour for hour, count in hanley_hourly_counts.items() if count == highest_hourly_count]
-            outcomes["Most Vehicles Hour"] = " and ".join([f"Between {hour}:00 and {int(hour) + 1}:00" for hour in most_vehicles_hours])
+        # Hourly and coarser counts are summed from the per-minute counts, not from the rows
+        rollups = TimeRollups(minute_counts)
+        outcomes["Time Rollups"] = rollups
+        if hanley_highway_vehicles:
+            outcomes["Highest Hourly Count"] = rollups.busiest("Hanley Highway/Westway", "hour")[0]
+            outcomes["Most Vehicles Hour"] = rollups.describe_busiest("Hanley Highway/Westway", "hour")
+
+        metrics.observe("traffic_outcome_duration_seconds", time.perf_counter() - outcome_started)
 
     except Exception as e:
         print(f"Error processing file: {e}")
@@ -161,6 +195,25 @@ def process_csv_data(file_name, day, month, year):
 
     return outcomes
 
+# Reserve a fresh file in the upload folder for an upload; the client's name only ends the file
+# name, so codecs are still recognised, and can neither leave the folder nor clash with another upload
+def unique_upload_path(file_name, prefix):
+    descriptor, file_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, prefix=prefix,
+                                             suffix="-" + os.path.basename(file_name or "upload.csv"))
+    os.close(descriptor)
+    return file_path
+
+# Save an upload to disk while hashing it, so identical uploads can be served from the cache
+def save_upload(file, file_path):
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'wb') as out:
+        for chunk in iter(lambda: file.stream.read(1 << 20), b''):
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
 @app.route('/static/<path:path>')
 def serve_static(path):
     return send_from_directory('static', path)
@@ -174,36 +227,266 @@ def home():
 # Route to handle form submission
 @app.route('/submit', methods=['POST'])
 def submit():
+    started = time.perf_counter()
+    try:
+        return handle_submit()
+    finally:
+        metrics.observe("traffic_request_duration_seconds", time.perf_counter() - started)
+
+def handle_submit():
     if request.method == 'POST':
-        file = request.files['file']
-
-        if file:
-            ensure_upload_folder_exists()
-            file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-            file.save(file_path)
-
-            # Extract day, month, and year from the filename (e.g., traffic_data15062024.csv)
-            filename = file.filename
-            date_match = re.search(r'(\d{2})(\d{2})(\d{4})', filename)
-
-            if date_match:
-                day = int(date_match.group(1))  # Extract day
-                month = int(date_match.group(2))  # Extract month
-                year = int(date_match.group(3))  # Extract year
-            else:
-                print("Date not found in filename, using default values.")
-                day, month, year = 1, 1, 2024
-
-            # Process CSV and get outcomes
-            outcomes = process_csv_data(file_path, day, month, year)
-
-            if outcomes:
-                return render_template('results.html', outcomes=outcomes)
-            else:
-                return "Error processing the file", 400
-        else:
+        files = [file for file in request.files.getlist('file') if file and file.filename]
+
+        if not files:
+            metrics.inc("traffic_errors_total", reason="no_file")
             return "No file selected", 400
 
+        ensure_upload_folder_exists()
+        uploads = []
+        try:
+            for file in files:
+                uploads.append(store_upload(file))
+
+            if len(uploads) == 1:
+                outcomes = outcomes_for_uploads(uploads)[0]
+                if outcomes:
+                    return render_template('results.html', outcomes=outcomes)
+                else:
+                    return "Error processing the file", 400
+
+            # Several days at once: process them side by side and compare
+            outcomes_list = [outcomes for outcomes in outcomes_for_uploads(uploads) if outcomes]
+            if not outcomes_list:
+                return "Error processing the files", 400
+            outcomes_list.sort(key=lambda outcomes: outcomes["Survey Date"])
+            return render_template('compare.html', outcomes_list=outcomes_list,
+                                   combined=merge_outcomes(outcomes_list), labels=COMPARISON_LABELS)
+        finally:
+            # Outcomes are cached by content, so neither the upload nor its quarantine file is read again
+            for upload in uploads:
+                discard_upload(upload["path"])
+
+# Save one uploaded file under a name of its own and work out its survey date from the client's name
+def store_upload(file):
+    file_path = unique_upload_path(file.filename, "upload-")
+    try:
+        with timings.stage("upload"):
+            digest, size = save_upload(file, file_path)
+    except BaseException:
+        os.remove(file_path)
+        raise
+    metrics.inc("traffic_uploads_total")
+    metrics.observe("traffic_upload_size_bytes", size)
+
+    # Extract day, month, and year from the filename (e.g., traffic_data15062024.csv)
+    survey_date = parse_filename_date(file.filename)
+    if not survey_date:
+        print("Date not found in filename, using default values.")
+        survey_date = (1, 1, 2024)
+
+    return {"path": file_path, "name": os.path.basename(file.filename), "cache_key": (digest, file.filename),
+            "date": survey_date}
+
+# Delete a processed upload and the quarantine file its bad rows were written to, if any
+def discard_upload(file_path):
+    for path in (file_path, quarantine_path_for(file_path)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+# Process uploads concurrently, answering repeats from the outcome cache
+def outcomes_for_uploads(uploads):
+    results = [None] * len(uploads)
+    pending = []
+    for index, upload in enumerate(uploads):
+        if upload["cache_key"] in outcome_cache:
+            metrics.inc("traffic_cache_hits_total")
+            outcome_cache.move_to_end(upload["cache_key"])
+            results[index] = outcome_cache[upload["cache_key"]]
+        else:
+            metrics.inc("traffic_cache_misses_total")
+            pending.append(index)
+
+    if len(pending) == 1:
+        # A single file gains nothing from a pool round trip
+        upload = uploads[pending[0]]
+        computed = [process_csv_data(upload["path"], *upload["date"])]
+    elif pending:
+        computed = list(get_worker_pool().map(
+            process_csv_data,
+            [uploads[index]["path"] for index in pending],
+            *zip(*[uploads[index]["date"] for index in pending]),
+        ))
+    else:
+        computed = []
+
+    for index, outcomes in zip(pending, computed):
+        if outcomes:
+            day, month, year = uploads[index]["date"]
+            outcomes["Survey Date"] = f"{year}-{month:02d}-{day:02d}"
+            outcomes["Data File"] = uploads[index]["name"]  # Not the name it was saved under
+            outcome_cache[uploads[index]["cache_key"]] = outcomes
+            if len(outcome_cache) > OUTCOME_CACHE_SIZE:
+                outcome_cache.popitem(last=False)
+        else:
+            metrics.inc("traffic_errors_total", reason="processing")
+        results[index] = outcomes
+    return results
+
+# Worker pool shared by all requests of this process, created on first use
+worker_pool = None
+
+def get_worker_pool():
+    global worker_pool
+    if worker_pool is None:
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        try:
+            worker_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 2)
+        except (OSError, NotImplementedError):
+            # Serverless runtimes without /dev/shm cannot host a process pool
+            worker_pool = ThreadPoolExecutor(max_workers=4)
+    return worker_pool
+
+# Outcome rows shown on the comparison page, in display order
+COMPARISON_LABELS = [
+    ("Total Vehicles", "Total Vehicles Recorded"),
+    ("Total Trucks", "Total Trucks"),
+    ("Total Electric Vehicles", "Total Electric Vehicles"),
+    ("Two-Wheeled Vehicles", "Total Two-Wheeled Vehicles"),
+    ("Buses North", "Buses North from Elm Avenue/Rabbit Road"),
+    ("Straight Through", "Vehicles Through Both Junctions Without Turning"),
+    ("Truck Percentage", "Truck Percentage"),
+    ("Over Speed Limit", "Vehicles Over Speed Limit"),
+    ("Elm Ave Rabbit Road", "Vehicles at Elm Avenue/Rabbit Road"),
+    ("Hanley Highway Westway", "Vehicles at Hanley Highway/Westway"),
+    ("Highest Hourly Count", "Highest Hourly Count on Hanley Highway/Westway"),
+    ("Most Vehicles Hour", "Busiest Hour on Hanley Highway/Westway"),
+    ("Rain Hours", "Total Rainy Hours"),
+]
+
+# Outcomes that are plain counts and can be added up across days
+SUMMED_OUTCOMES = [
+    "Total Vehicles", "Total Trucks", "Total Electric Vehicles", "Two-Wheeled Vehicles",
+    "Buses North", "Straight Through", "Over Speed Limit", "Elm Ave Rabbit Road",
+    "Hanley Highway Westway", "Rain Hours",
+]
+
+# Combine the outcomes of several days into one column for the comparison page
+def merge_outcomes(outcomes_list):
+    combined = {key: sum(outcomes[key] for outcomes in outcomes_list) for key in SUMMED_OUTCOMES}
+    total_vehicles = combined["Total Vehicles"]
+    combined["Truck Percentage"] = round((combined["Total Trucks"] / total_vehicles) * 100) if total_vehicles else 0
+
+    busiest = max(outcomes_list, key=lambda outcomes: outcomes["Highest Hourly Count"])
+    combined["Highest Hourly Count"] = busiest["Highest Hourly Count"]
+    combined["Most Vehicles Hour"] = f"{busiest['Survey Date']}: {busiest['Most Vehicles Hour']}"
+    return combined
+
+# Route to return sampled estimates quickly, before the full pass in /submit
+@app.route('/preview', methods=['POST'])
+def preview():
+    file = request.files.get('file')
+    if not file:
+        return jsonify({"error": "No file selected"}), 400
+
+    ensure_upload_folder_exists()
+    file_path = unique_upload_path(file.filename, "preview-")
+    try:
+        save_upload(file, file_path)
+
+        rows = validate_csv(file_path)
+        if not rows:
+            return jsonify({"error": "The file could not be read as CSV"}), 400
+        from preview import estimate_outcomes
+
+        try:
+            # The form sends only the start of a large file, with the size of the whole file
+            estimates = estimate_outcomes(file_path, total_size=request.form.get('size', type=int))
+        except (ValueError, UnicodeDecodeError, EOFError) as e:
+            return jsonify({"error": f"Error previewing the file: {e}"}), 400
+    finally:
+        os.remove(file_path)  # Previews are never submitted, so nothing else reads the file
+
+    estimates["Rows"] = rows
+    return jsonify(estimates)
+
+# Route to show the results of a day from the drop directory, ingested ahead of time by watcher.py
+@app.route('/day/<date>')
+def day_results(date):
+    outcomes, status = day_outcomes(date)
+    if outcomes is None:
+        return status
+    return render_template('results.html', outcomes=outcomes)
+
+# Vehicle counts of a surveyed day at any resolution, e.g. /day/15062024/counts?resolution=15min
+@app.route('/day/<date>/counts')
+def day_counts(date):
+    try:
+        width = resolution_seconds(request.args.get("resolution", "hour"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    outcomes, status = day_outcomes(date)
+    if outcomes is None:
+        return jsonify({"error": status[0]}), status[1]
+    rollups = outcomes.get("Time Rollups") or TimeRollups.from_hourly_counts(outcomes["Hourly Counts"])
+    try:
+        counts = rollups.counts(width)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    highest, _ = rollups.busiest("Hanley Highway/Westway", width)
+    return jsonify({
+        "resolution_seconds": width,
+        "counts": counts,
+        "busiest": {"junction": "Hanley Highway/Westway", "count": highest,
+                    "periods": rollups.describe_busiest("Hanley Highway/Westway", width)},
+    })
+
+# Outcomes of a surveyed day from the drop directory's cache, processing the file on a miss;
+# returns (outcomes, None), or (None, (message, status code)) when the day cannot be answered
+def day_outcomes(date):
+    survey_date = parse_filename_date(f"traffic_data{date}.csv") if len(date) == 8 else None
+    if not DATA_DIR or not survey_date:
+        return None, ("No survey found for that date", 404)
+    from survey_cache import SurveyCache, ingest_survey
+
+    file_path = find_survey(os.path.join(DATA_DIR, f"traffic_data{date}.csv"))
+    cache = SurveyCache.for_directory(DATA_DIR)
+    # Either entry will do: one ingested with or without duplicate rows removed
+    outcomes = cache.get(file_path) or cache.get(file_path, deduplicated=True)
+    if outcomes is not None:
+        metrics.inc("traffic_cache_hits_total")
+        return outcomes, None
+
+    # Not ingested yet (watcher not running or still busy): process it now and keep the result
+    if not os.path.exists(file_path):
+        return None, ("No survey found for that date", 404)
+    metrics.inc("traffic_cache_misses_total")
+    # The entry is shared with the program and the watcher, so it is built by the
+    # program's own processing (with hourly, type and speed detail), not by process_csv_data here
+    try:
+        outcomes = ingest_survey(file_path, cache.cache_dir)
+    except OSError as e:
+        print(f"Could not cache results for {file_path}: {e}")
+        outcomes = None
+    if not outcomes:
+        metrics.inc("traffic_errors_total", reason="processing")
+        return None, ("Error processing the file", 400)
+    return outcomes, None
+
+# Route to expose the timing report when TRAFFIC_PROFILE is set
+@app.route('/timings')
+def timing_report():
+    if not timings.enabled:
+        return "Profiling is disabled; set TRAFFIC_PROFILE to enable it", 404
+    return jsonify(timings.report())
+
+# Route to expose Prometheus metrics summed across all worker processes
+@app.route('/metrics')
+def metrics_endpoint():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 # Route to render results
 @app.route('/results')
 def results():
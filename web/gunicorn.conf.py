@@ -0,0 +1,12 @@
+# gunicorn reads this file when started from the web folder, e.g. gunicorn app:app
+import os
+
+# The app imports the shared modules (survey_io, metrics, ...) from the repository root
+pythonpath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def on_starting(server):
+    # Worker files left by the previous run would otherwise be added to this run's metrics
+    from metrics import clear_metrics_dir
+
+    clear_metrics_dir()
@@ -1,19 +1,67 @@
 document.addEventListener("DOMContentLoaded", function() {
     const form = document.getElementById("uploadForm");
 
+    // Bytes of the first file sent for the preview; the server scales its estimates to the whole file
+    const PREVIEW_BYTES = 4 * 1024 * 1024;
+
+    // Format an estimate as "value ± margin", or just the value when it is exact or has no margin
+    function formatEstimate(estimate, suffix) {
+        if (!estimate.margin) {
+            return estimate.value + suffix;
+        }
+        return estimate.value + suffix + " ± " + estimate.margin + suffix;
+    }
+
+    function previewHeading(preview) {
+        if (preview.Exact) {
+            return "Results";
+        }
+        if (preview.Sample === "head") {
+            return "Rough estimate from the start of the file";
+        }
+        return "Approximate results (95% confidence)";
+    }
+
     // Listen for form submission
     form.addEventListener("submit", function(event) {
         event.preventDefault();
 
-            Swal.fire({
-                title: 'Success!',
-                text: 'Your file was uploaded successfully!',
-                icon: 'success',
-                confirmButtonText: 'OK'
-            });
+        // Ask for estimates from the start of the first file; the exact results follow from the full submit
+        const file = document.getElementById("file").files[0];
+        const sample = new FormData();
+        sample.append("file", file.slice(0, PREVIEW_BYTES), file.name);
+        sample.append("size", file.size);
 
-        setTimeout(function() {
-            form.submit();
-        }, 2000);
+        fetch("/preview", { method: "POST", body: sample })
+            .then(function(response) { return response.json(); })
+            .then(function(preview) {
+                if (preview.error) {
+                    throw new Error(preview.error);
+                }
+                Swal.fire({
+                    title: 'Success!',
+                    html: "<p>Your file was uploaded successfully!</p>" +
+                          "<p><strong>" + previewHeading(preview) + "</strong></p>" +
+                          "<p>Total vehicles: " + formatEstimate(preview["Total Vehicles"], "") + "</p>" +
+                          "<p>Truck percentage: " + formatEstimate(preview["Truck Percentage"], "%") + "</p>" +
+                          "<p>Busiest Hanley Highway hour: " + preview["Most Vehicles Hour"] +
+                          " (" + formatEstimate(preview["Highest Hourly Count"], "") + " vehicles)</p>" +
+                          "<p>Calculating exact results...</p>",
+                    icon: 'success',
+                    confirmButtonText: 'OK'
+                });
+            })
+            .catch(function() {
+                Swal.fire({
+                    title: 'Success!',
+                    text: 'Your file was uploaded successfully!',
+                    icon: 'success',
+                    confirmButtonText: 'OK'
+                });
+            })
+            .finally(function() {
+                // The page, and the estimates on it, stay up until the exact results arrive
+                form.submit();
+            });
     });
 });